@@ -1,6 +1,8 @@
 import shlex
 from state import AppState, Mode
-from commands import auth, feed, post, profile, follow, chat, room, moderation, help
+from commands import auth, feed, post, profile, follow, chat, room, moderation, search, help
+from storage.fs import BeepFS
+from storage.crypto import start_key_pool
 
 state = AppState()
 
@@ -11,9 +13,10 @@ COMMAND_MODULES = {
     "profile": ["profile"],
     "follow": ["follow", "unfollow"],
     "chat": ["chat", "say", "read", "exit"],
-    "room": ["room", "join", "leave", "invite", "say", "late"],
-    "feed": ["fyp", "next", "hold", "resume"],
+    "room": ["room", "join", "leave", "invite", "say", "late", "sweep"],
+    "feed": ["fyp", "next", "hold", "resume", "comments"],
     "moderation": ["mute", "unmute", "kick", "mod", "unmod"],
+    "search": ["search", "trending"],
     "help": ["help"],
 }
 
@@ -26,6 +29,7 @@ MODULE_DISPATCH = {
     "room": room.dispatch,
     "feed": feed.dispatch,
     "moderation": moderation.dispatch,
+    "search": search.dispatch,
     "help": help.dispatch,
 }
 
@@ -49,6 +53,19 @@ def get_prompt():
 def main_loop():
     print("Welcome to Beep CLI v0.2")
 
+    fs = BeepFS()
+    # Move posts created before time-ordered ids (no-op once done)
+    fs.migrate_post_ids()
+    # First SQLite start imports the JSON files; the file and pack backends
+    # shard or pack loose post files in the background
+    fs.prepare_storage()
+    # Delete expired ephemeral rooms now and as they expire
+    fs.start_room_sweeper()
+    # Pick up history backfills interrupted by a previous session
+    fs.resume_backfills()
+    # Keep a few keys pre-generated for the next registration
+    start_key_pool()
+
     while True:
         try:
             line = input(get_prompt()).strip()
@@ -1,11 +1,13 @@
 import shlex
 import getpass
 from storage import profile
+from storage.crypto import keyring, create_identity, key_type, KEY_TYPES
 
 def dispatch(cmd, args, state):
     parts = shlex.split(args)
     username = None
     password = None
+    identity = None
 
     # Parse flags
     i = 0
@@ -18,6 +20,10 @@ def dispatch(cmd, args, state):
             i += 1
             if i < len(parts):
                 password = parts[i]
+        elif parts[i] in ("-k", "--key-type"):
+            i += 1
+            if i < len(parts):
+                identity = parts[i].lower()
         i += 1
 
     # Interactive password if not supplied
@@ -31,8 +37,14 @@ def dispatch(cmd, args, state):
                 return
 
             username_clean = username.lower()  # lowercase for storage
+            if identity and identity not in KEY_TYPES:
+                print(f"[AUTH] Error: key type must be one of: {', '.join(KEY_TYPES)}")
+                return
             user = profile.create_user(username_clean, password)
             state.user = user["username"]
+            if not key_type(state.user):
+                create_identity(state.user, identity)
+            keyring.unlock(state.user)
             print(f"[AUTH] User '{username_clean}' registered successfully!")
 
         elif cmd == "login":
@@ -43,12 +55,14 @@ def dispatch(cmd, args, state):
             username_clean = username.lower()  # lowercase for lookup
             user = profile.authenticate(username_clean, password)
             state.user = user["username"]
+            keyring.unlock(state.user)
             print(f"[AUTH] User '{username_clean}' logged in successfully!")
 
         elif cmd == "logout":
             if state.user:
                 print(f"[AUTH] User '{state.user}' logged out.")
                 state.user = None
+                keyring.lock()
             else:
                 print("[AUTH] No user currently logged in.")
 
@@ -19,17 +19,18 @@ def dispatch(cmd, args, state):
 
         # -------- LIST MY CHATS --------
         if not parts:
-            chats = fs.list_chats()
-            my_chats = [c for c in chats if user in c.split("__")]
+            my_chats = fs.list_inbox(user)
 
             if not my_chats:
                 print("No chats.")
                 return
 
             print("Chats:")
-            for c in my_chats:
-                other = c.replace(user, "").replace("__", "")
-                print(f" - {other}")
+            for _, entry in my_chats:
+                unread = entry["count"] - entry["read"]
+                last = datetime.fromtimestamp(entry["last_at"]).strftime("%d.%m %H:%M")
+                badge = f" ({unread} unread)" if unread > 0 else ""
+                print(f" - {entry['peer']}{badge}  · last {last}")
             return
 
         target = parts[0]
@@ -77,22 +78,26 @@ def dispatch(cmd, args, state):
 
         num = DEFAULT_READ
         show_all = False
+        only_new = False
 
         if parts:
             if parts[0] == "--all":
                 show_all = True
+            elif parts[0] == "--new":
+                only_new = True
             elif parts[0].isdigit():
                 num = int(parts[0])
 
-        msgs, _ = fs.chat_read_messages(state.current_chat, user)
+        msgs, _ = fs.chat_read_messages(
+            state.current_chat, user, limit=None if show_all else num, new=only_new
+        )
         if not msgs:
-            print("No messages yet.")
+            print("No new messages." if only_new else "No messages yet.")
             return
 
-        display = msgs if show_all else msgs[-num:]
-        display.sort(key=lambda m: m["timestamp"])
+        msgs.sort(key=lambda m: m["timestamp"])
 
-        for m in display:
+        for m in msgs:
             t = datetime.fromtimestamp(m["timestamp"]).strftime("%H:%M")
             print(f"[{t}] {m['sender']}: {m['content']}")
 
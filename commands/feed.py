@@ -5,6 +5,8 @@ from datetime import datetime
 
 fs = BeepFS()
 POSTS_PER_PAGE = 15
+COMMENTS_PER_POST = 5
+COMMENTS_PER_PAGE = 20
 
 
 def relative_time(iso_ts):
@@ -34,39 +36,56 @@ def relative_time(iso_ts):
     return f"{years}y ago"
 
 
-def _get_comments(post_id):
-    """Return post_ids that are comments of the given post."""
-    all_posts = fs.list_posts()
-    comments = []
-    for pid in all_posts:
-        post = fs.read_post(pid)
-        # Only include comments where type=="comment" and parent_id matches
-        if post.get("type") == "comment" and post.get("parent_id") == post_id:
-            comments.append(pid)
-    return comments
+def _print_comments(post_id, indent, cursor=None, limit=COMMENTS_PER_POST, loaded=None, page=None):
+    """
+    Print one page of comments under a post, with a hint when more remain.
+    loaded, page: posts already read and the comment page already fetched (see _prefetch).
+    """
+    comments, next_cursor = page if page is not None else fs.get_comments(post_id, limit=limit, cursor=cursor)
+    if loaded is None or any(c not in loaded for c in comments):
+        loaded = fs.read_posts(comments)
+    for c in comments:
+        c_data = loaded[c]
+        c_ts = c_data.get("timestamp")
+        rel = relative_time(c_ts) if c_ts else ""
+        print(f"{indent}: [{rel}] [{c_data.get('creator')}] - {c}: {c_data.get('content', '')}")
+    if next_cursor:
+        print(f"{indent}: ... more comments: beep comments {post_id} {next_cursor}")
+
+
+def _prefetch(posts):
+    """
+    Read every post a page shows (posts, shared originals, first comments) in one batch.
+    Returns (loaded posts, {post_id: its first comment page}).
+    """
+    ids = list(posts)
+    pages = {}
+    for post_id in posts:
+        original_id = (fs.post_info(post_id) or {}).get("shared_from")
+        if original_id:
+            ids.append(original_id)
+        pages[post_id] = fs.get_comments(post_id, limit=COMMENTS_PER_POST)
+        ids.extend(pages[post_id][0])
+    return fs.read_posts(ids), pages
 
 
 def _print_posts(posts, state):
     """Print posts nicely with shared, quoted, comments, deleted."""
+    loaded, pages = _prefetch(posts)
     for post_id in posts:
-        data = fs.read_post(post_id)
+        data = loaded[post_id]
 
         # ---------------- DELETED POSTS ----------------
         if data.get("revoked"):
             print(f":: [deleted post] - {post_id}")
-            comments = _get_comments(post_id)
-            for c in comments:
-                c_data = fs.read_post(c)
-                c_ts = c_data.get("timestamp")
-                rel = relative_time(c_ts) if c_ts else ""
-                print(f"    : [{rel}] [{c_data.get('creator')}] - {c}: {c_data.get('content', '')}")
+            _print_comments(post_id, "    ", loaded=loaded, page=pages[post_id])
             print()
             continue
 
         # ---------------- SHARED / QUOTED POSTS ----------------
         if data.get("shared_from"):
             original_id = data["shared_from"]
-            original = fs.read_post(original_id)
+            original = loaded[original_id] if original_id in loaded else fs.read_post(original_id)
             t = datetime.fromisoformat(data["timestamp"]).strftime("%d.%m.%Y")
             rel = relative_time(data["timestamp"])
             label = "Quoted" if data.get("quote", False) else "Shared"
@@ -76,12 +95,7 @@ def _print_posts(posts, state):
                 ot = datetime.fromisoformat(original["timestamp"]).strftime("%d.%m.%Y")
                 orel = relative_time(original["timestamp"])
                 print(f"      ↳ [{ot} · {orel}] [{original.get('creator')}] - {original_id}: {original.get('content')}")
-            comments = _get_comments(post_id)
-            for c in comments:
-                c_data = fs.read_post(c)
-                c_ts = c_data.get("timestamp")
-                rel = relative_time(c_ts) if c_ts else ""
-                print(f"      : [{rel}] [{c_data.get('creator')}] - {c}: {c_data.get('content', '')}")
+            _print_comments(post_id, "      ", loaded=loaded, page=pages[post_id])
             print()
             continue
 
@@ -91,40 +105,48 @@ def _print_posts(posts, state):
         print(f":: [{t} · {rel}] [{data.get('creator')}] - {post_id}: {data.get('content', '')}")
 
         # ---------------- COMMENTS ----------------
-        comments = _get_comments(post_id)
-        for c in comments:
-            c_data = fs.read_post(c)
-            c_ts = c_data.get("timestamp")
-            rel = relative_time(c_ts) if c_ts else ""
-            print(f"    : [{rel}] [{c_data.get('creator')}] - {c}: {c_data.get('content', '')}")
+        _print_comments(post_id, "    ", loaded=loaded, page=pages[post_id])
 
         print()  # Blank line between posts
 
 
 def dispatch(cmd, args, state):
-    """Dispatch FYP commands: fyp, next, hold, resume."""
-    if not hasattr(state, "fyp_index"):
-        state.fyp_index = 0
-
+    """Dispatch FYP commands: fyp, next, hold, resume, comments."""
     if cmd == "fyp":
         fyp_type = args or "global"
         state.switch_fyp(fyp_type)
-        state.fyp_index = 0
-        posts = _get_current_feed(state)
+        # New snapshot: posts created after this are not paged into this feed
+        if fyp_type == "foryou":
+            state.feed_cursor = fs.new_ranked_cursor(state.user)
+        else:
+            state.feed_cursor = fs.new_feed_cursor()
+        posts, state.feed_cursor = _get_current_feed(state)
         _print_posts(posts, state)
 
     elif cmd == "next":
         if getattr(state, "hold", False):
             print("[FYP] Feed is on hold. Use 'resume' to continue.")
             return
-        state.fyp_index += POSTS_PER_PAGE
-        posts = _get_current_feed(state)
+        posts, cursor = _get_current_feed(state)
         if not posts:
             print("[FYP] No more posts.")
-            state.fyp_index -= POSTS_PER_PAGE
             return
+        state.feed_cursor = cursor
         _print_posts(posts, state)
 
+    elif cmd == "comments":
+        parts = args.split() if args else []
+        if not parts:
+            print("[COMMENTS] Usage: comments <post_id> [<after_comment_id>]")
+            return
+        post_id = parts[0]
+        cursor = parts[1] if len(parts) > 1 else None
+        if not fs.count_comments(post_id):
+            print(f"[COMMENTS] No comments on {post_id}")
+            return
+        print(f":: Comments on {post_id}")
+        _print_comments(post_id, "    ", cursor=cursor, limit=COMMENTS_PER_PAGE)
+
     elif cmd == "hold":
         state.toggle_hold()
         print(f"[FYP] Feed hold: {state.hold}")
@@ -138,17 +160,12 @@ def dispatch(cmd, args, state):
 
 
 def _get_current_feed(state):
-    """Return posts for current FYP mode."""
-    start = getattr(state, "fyp_index", 0)
-    end = start + POSTS_PER_PAGE
-
+    """Return (posts, next cursor) for the page after state.feed_cursor."""
+    followed_by = None
     if getattr(state, "fyp_type", "global") == "followed":
         if not state.user:
             print("[FYP] You must be logged in to view followed feed. Showing global feed.")
-            posts = fs.list_posts()
         else:
-            posts = fs.list_followed_posts(state.user)
-    else:
-        posts = fs.list_posts()
+            followed_by = state.user
 
-    return posts[start:end]
+    return fs.page_posts(state.feed_cursor, limit=POSTS_PER_PAGE, followed_by=followed_by)
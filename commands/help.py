@@ -8,16 +8,19 @@ Note:
   • Example: beep post "hello world"
 
 -- Identity & Session --
-  register -u <username> -p <password>   Create local identity (generates keys)
+  register -u <username> -p <password> [-k rsa|ec]
+                                       Create local identity (generates keys)
   login  -u <username> -p <password>   Unlock identity
   logout                               Lock identity
 
 -- Feed (FYP) --
   fyp global                            Switch to global feed (default)
   fyp followed                          Switch to followed feed
+  fyp foryou                            Ranked feed (recent, engaging, people you follow)
   next                                  Load next posts
   hold                                  Pause auto-loading
   resume                                Resume auto-loading
+  comments <post_id> [<after_id>]       Page through a post's comments
 
 -- Posts --
   post "content"                        Create a post
@@ -25,6 +28,8 @@ Note:
   share <post_id>                       Share a post (reference)
   quote <post_id> "text"                Quote a post (new post)
   delete <post_id>                      Delete your post
+  search <terms>                        Search posts (end a term with * for a prefix)
+  trending                              Hashtags and mentions used most lately
 
 -- Profile --
   profile                               View your profile
@@ -39,19 +44,20 @@ Note:
   unfollow <username>                   Unfollow a user
 
 -- Chat --
-  chat                                  List chats
+  chat                                  List chats (latest first, with unread counts)
   chat <username>                       Enter direct chat or room
   say "message"                         Send message (chat mode)
-  read [--all | <number>]               Read messages
+  read [--all | --new | <number>]       Read messages (--new: only unread ones)
   exit                                  Leave chat / return to feed
 
 -- Rooms --
-  room                                  List rooms
+  room                                  List rooms (with new message counts)
   room <name> [--private] [--ephemeral] Create a room
   say "message"                         Send message (room mode)
-  late [--all | <number>]               Read room messages
+  late [--all | --new | <number>]       Read room messages (--new: only unread ones)
   join <name>                           Join a room
   invite <username>                     Invite user to private room
+  sweep                                 Delete expired ephemeral rooms now
   leave                                 Leave chat / return to fe
   ed
 
@@ -92,6 +92,8 @@ def dispatch(cmd, args, state):
         if target not in room["banned"]:
             room["banned"].append(target)
         fs._write_room(room)
+        # The kicked member must not be able to read anything sent from now on
+        fs.rotate_room_key(room)
         print(f"{target} kicked and banned")
 
     else:
@@ -37,18 +37,20 @@ def dispatch(cmd, args, state):
     print(f"Posts: {len(profile_data.get('posts', []))}")
     print(f"Shared: {len(profile_data.get('shared', []))}\n")
 
-    # --- Recursive display for nested comments/quotes ---
-    def display_post(post_id, indent=0):
-        data = fs.read_post(post_id)
-        status = "[deleted]" if data.get("revoked") else ""
-        prefix = "    " * indent
-        print(f"{prefix}- {post_id} {status}: {data['content'][:50]}")
-
-        # Children: all posts where shared_from == post_id
-        all_posts = fs.list_posts()  # global list of all posts
-        children = [p for p in all_posts if fs.read_post(p).get("shared_from") == post_id]
-        for child_id in children:
-            display_post(child_id, indent=indent+1)
+    # --- Bounded display of the share/quote trees under posts ---
+    def display_posts(post_ids):
+        trees = [list(fs.walk_lineage(post_id)) for post_id in post_ids]
+        # One batched read for every node of every tree
+        loaded = fs.read_posts(pid for tree in trees for _, pid, _, _ in tree)
+        for tree in trees:
+            for depth, pid, total, hidden in tree:
+                data = loaded[pid]
+                status = "[deleted]" if data.get("revoked") else ""
+                prefix = "    " * depth
+                count = f" ({total} shares/quotes)" if total else ""
+                if hidden:
+                    count = f" ({total} shares/quotes, {hidden} not shown)"
+                print(f"{prefix}- {pid} {status}: {data['content'][:50]}{count}")
 
     # --- Show user posts if requested ---
     if show_posts:
@@ -57,9 +59,8 @@ def dispatch(cmd, args, state):
         if not posts:
             print("  No posts yet.")
         else:
-            top_posts = [p for p in posts if fs.read_post(p).get("shared_from") is None]
-            for post_id in top_posts:
-                display_post(post_id)
+            top_posts = [p for p in posts if not (fs.post_info(p) or {}).get("shared_from")]
+            display_posts(top_posts)
 
     # --- Show shared posts if requested ---
     if show_shared:
@@ -68,7 +69,6 @@ def dispatch(cmd, args, state):
         if not shared:
             print("  No shared posts yet.")
         else:
-            for post_id in shared:
-                display_post(post_id)
+            display_posts(shared)
 
     print("")  # extra newline for readability
@@ -14,8 +14,9 @@ def dispatch(cmd, args, state):
       join   -> join a room (login required)
       leave  -> leave current room
       say    -> send a message (room-only, login required)
-      late   -> show latest messages (room-only)
+      late   -> show latest messages (room-only; --new: only unread ones)
       invite -> invite user to room (room-only, login required)
+      sweep  -> delete expired ephemeral rooms now
     """
 
     ROOM_ONLY = {"say", "late", "invite"}
@@ -48,9 +49,11 @@ def dispatch(cmd, args, state):
             if not rooms:
                 print("No rooms available.")
             else:
+                unread = fs.unread_rooms(user) if user else {}
                 print("Available rooms:")
                 for r in rooms:
-                    print(f" - {r}")
+                    badge = f" ({unread[r]} new)" if unread.get(r) else ""
+                    print(f" - {r}{badge}")
             return
 
         # Room name provided -> create new room
@@ -106,25 +109,37 @@ def dispatch(cmd, args, state):
     # SHOW LATEST MESSAGES
     elif cmd == "late":
         show_all = False
+        only_new = False
         num = DEFAULT_LATEST
         if parts:
             if parts[0] == "--all":
                 show_all = True
+            elif parts[0] == "--new":
+                only_new = True
             elif parts[0].isdigit():
                 num = int(parts[0])
 
-        msgs, total = fs.read_messages(state.current_room, user)
+        msgs, total = fs.read_messages(
+            state.current_room, user, limit=None if show_all else num, new=only_new
+        )
         if not msgs:
-            print("No messages in this room yet.")
+            print("No new messages." if only_new else "No messages in this room yet.")
             return
 
-        display = msgs if show_all else msgs[-num:]
-        display.sort(key=lambda m: m["timestamp"])
+        msgs.sort(key=lambda m: m["timestamp"])
 
-        for m in display:
+        for m in msgs:
             t = datetime.fromtimestamp(m["timestamp"]).strftime("%H:%M")
             print(f"[{t}] {m['sender']}: {m['content']}")
 
+    # DELETE EXPIRED EPHEMERAL ROOMS
+    elif cmd == "sweep":
+        swept = fs.sweep_expired_rooms()
+        if not swept:
+            print("No expired rooms.")
+        else:
+            print(f"Deleted {len(swept)} expired room(s): {', '.join(sorted(swept))}")
+
     # INVITE USER
     elif cmd == "invite":
         if not parts:
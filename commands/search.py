@@ -0,0 +1,50 @@
+# commands/search.py
+
+from storage.fs import BeepFS
+from commands.feed import relative_time
+
+fs = BeepFS()
+RESULTS = 10
+TRENDING = 10
+
+
+def _print_trending():
+    for title, kind in (("Trending hashtags", "#"), ("Trending mentions", "@")):
+        tags = fs.trending_tags(limit=TRENDING, kind=kind)
+        print(f":: {title}")
+        if not tags:
+            print("  Nothing yet.")
+        for rank, (tag, score) in enumerate(tags, 1):
+            print(f"  {rank:>2}. {tag}  ({score:.1f})")
+
+
+def dispatch(cmd, args, state):
+    """
+    Full-text search over posts, best matches first, and trending tags.
+
+    Usage:
+      beep search <terms>      -> posts containing every term
+      beep search hel*         -> terms ending in * match as a prefix
+      beep trending            -> most used hashtags/mentions lately
+    """
+    if cmd == "trending":
+        _print_trending()
+        return
+
+    query = args.strip()
+    if not query:
+        print("[SEARCH] Usage: search <terms>  (end a term with * to match a prefix)")
+        return
+
+    results = fs.search(query, limit=RESULTS)
+    if not results:
+        print(f"[SEARCH] No posts match '{query}'")
+        return
+
+    posts = fs.read_posts(results)
+    print(f":: {len(results)} result(s) for '{query}'")
+    for post_id in results:
+        data = posts[post_id]
+        rel = relative_time(data["timestamp"]) if data.get("timestamp") else ""
+        kind = f"{data.get('type')} " if data.get("type") not in (None, "post") else ""
+        print(f"  - {kind}[{rel}] [{data.get('creator')}] - {post_id}: {data.get('content', '')[:80]}")
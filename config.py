@@ -0,0 +1,35 @@
+import os
+
+# Threads used to decrypt whole message histories (late --all / read --all)
+DECRYPT_WORKERS = int(os.environ.get("BEEP_DECRYPT_WORKERS", os.cpu_count() or 1))
+
+# Below this many messages a history is decrypted on the calling thread
+PARALLEL_DECRYPT_MIN = 64
+
+# Threads used to re-encrypt room history for members who join with re_encrypt_old
+BACKFILL_WORKERS = int(os.environ.get("BEEP_BACKFILL_WORKERS", os.cpu_count() or 1))
+
+# Identity created for new users: "rsa" (RSA-2048) or "ec" (X25519 + Ed25519)
+KEY_TYPE = os.environ.get("BEEP_KEY_TYPE", "rsa")
+
+# Pre-generated keys kept per key kind so registration never waits on keygen (0 = off)
+KEY_POOL_SIZE = int(os.environ.get("BEEP_KEY_POOL_SIZE", 2))
+
+# Storage backend, picked once at startup:
+#   "files"   one JSON file per post, profile, room and chat
+#   "pack"    as "files", but posts go into append-only packs read through
+#             mmap (loose post files are folded in by a background compactor)
+#   "sqlite"  posts, users, follows, rooms, chats and their messages in one
+#             database, beep.db (WAL mode); the JSON tree is imported on first start
+STORAGE_BACKEND = os.environ.get("BEEP_STORAGE_BACKEND", "files")
+
+# Seconds between background pack compactions ("pack" backend only)
+PACK_COMPACT_INTERVAL = int(os.environ.get("BEEP_PACK_COMPACT_INTERVAL", 600))
+
+# Threads used to read post files for one feed/profile page, and the batch size
+# below which they are read on the calling thread
+READ_WORKERS = int(os.environ.get("BEEP_READ_WORKERS", 4))
+PARALLEL_READ_MIN = 16
+
+# Longest pause (seconds) between sweeps for expired ephemeral rooms
+ROOM_SWEEP_INTERVAL = int(os.environ.get("BEEP_ROOM_SWEEP_INTERVAL", 300))
@@ -2,7 +2,8 @@ from pathlib import Path
 import shutil
 
 STORAGE_DIR = Path.home() / ".beep_storage"
-SUBFOLDERS = ["users", "profiles", "posts", "rooms", "chats"]
+SUBFOLDERS = ["users", "profiles", "posts", "packs", "trending", "rooms", "chats", "inbox", "logs", "jobs"]
+INDEX_FILES = ["posts_catalog.jsonl", "post_aliases.json", "search_index.jsonl", "beep.db", "beep.db-wal", "beep.db-shm"]
 
 # Delete contents of each folder
 for sub in SUBFOLDERS:
@@ -11,6 +12,10 @@ for sub in SUBFOLDERS:
         shutil.rmtree(folder)
     folder.mkdir(parents=True, exist_ok=True)
 
+# Drop indexes built over the deleted folders
+for name in INDEX_FILES:
+    (STORAGE_DIR / name).unlink(missing_ok=True)
+
 print("All storage cleared. Fresh folders recreated:")
 for sub in SUBFOLDERS:
     print(f" - {STORAGE_DIR / sub}")
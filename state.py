@@ -12,15 +12,16 @@ class AppState:
         self.user = None
         self.mode = Mode.GLOBAL_FYP
         self.fyp_type = "global"
+        self.feed_cursor = None     # position in the current feed (see BeepFS.page_posts)
         self.current_chat = None
         self.current_room = None
         self.hold = False
 
     def switch_fyp(self, fyp):
-        if fyp not in ["global", "followed"]:
+        if fyp not in ["global", "followed", "foryou"]:
             raise ValueError("Invalid FYP type")
         self.fyp_type = fyp
-        self.mode = Mode.GLOBAL_FYP if fyp == "global" else Mode.FOLLOWED_FYP
+        self.mode = Mode.FOLLOWED_FYP if fyp == "followed" else Mode.GLOBAL_FYP
 
     def enter_chat(self, username):
         self.mode = Mode.CHAT
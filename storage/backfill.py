@@ -0,0 +1,90 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from storage.fileio import write_json
+import config
+
+
+class Backfill:
+    """
+    Resumable job that gives a new member access to a log's per-member
+    RSA messages (the format used before content keys).
+
+    The log is processed one segment at a time: blobs for the new member
+    are computed on a worker pool outside the log lock, merged into the
+    segment in one rewrite, and the job file is checkpointed. A job file
+    that is still present on startup is picked up where it stopped.
+    """
+
+    def __init__(self, job_path, log, reencrypt):
+        self.job_path = Path(job_path)
+        self.log = log
+        # reencrypt(record) -> hex blob for the new member, or None to skip
+        self.reencrypt = reencrypt
+        self.job = json.loads(self.job_path.read_text())
+
+    @staticmethod
+    def create(job_path, log, kind, name, user):
+        """Write the job file covering the log's current segments."""
+        segments = log.segments()
+        job = {
+            "kind": kind,
+            "name": name,
+            "user": user,
+            "next_segment": segments[0] if segments else 0,
+            "end_segment": segments[-1] if segments else -1,
+        }
+        write_json(job_path, job)
+        return job
+
+    def _checkpoint(self):
+        write_json(self.job_path, self.job)
+
+    def _pending(self, segment):
+        user = self.job["user"]
+        return [
+            (seq, record) for seq, record in self.log.read_segment(segment)
+            if "encrypted" in record and user not in record["encrypted"]
+        ]
+
+    def run(self, workers=None):
+        user = self.job["user"]
+        workers = workers or config.BACKFILL_WORKERS
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while self.job["next_segment"] <= self.job["end_segment"]:
+                segment = self.job["next_segment"]
+                pending = self._pending(segment)
+                blobs = pool.map(lambda item: self._safe_reencrypt(item[1]), pending)
+                updates = {seq: blob for (seq, _), blob in zip(pending, blobs) if blob}
+
+                def merge(seq, record):
+                    # Merge into the current record so concurrent jobs for
+                    # other members keep their additions
+                    blob = updates.get(seq)
+                    if blob is None or "encrypted" not in record or user in record["encrypted"]:
+                        return None
+                    record["encrypted"][user] = blob
+                    return record
+
+                if updates:
+                    self.log.rewrite(merge, segments=[segment])
+                self.job["next_segment"] = segment + 1
+                self._checkpoint()
+
+        self.job_path.unlink(missing_ok=True)
+
+    def _safe_reencrypt(self, record):
+        try:
+            return self.reencrypt(record)
+        except Exception:
+            # Undecryptable history stays unreadable for the new member
+            return None
+
+    def start(self):
+        """Run in a daemon thread; progress survives via the job file."""
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,266 @@
+import heapq
+import json
+from bisect import bisect_left, insort
+from pathlib import Path
+
+from storage.ids import id_time
+from storage.locks import file_lock
+from storage.fileio import JsonlTail, write_atomic
+
+# Fields kept per post in the catalog (everything except the content)
+CATALOG_FIELDS = ("creator", "type", "parent_id", "shared_from", "revoked", "timestamp")
+
+# Order of the per-post engagement counters
+ENGAGEMENT_TYPES = ("comment", "share", "quote")
+
+# Compact the log once it holds this many superseded lines
+COMPACT_SLACK = 5000
+
+
+class PostCatalog:
+    """
+    Append-only on-disk index of post metadata.
+
+    Every save of a post appends one JSON line with its catalog entry.
+    Later lines override earlier ones for the same post_id, so the file
+    can be tailed incrementally by every process that shares it.
+    """
+
+    def __init__(self, path, stored_posts, followed_lists=None):
+        self.path = Path(path)
+        # stored_posts() yields (post_id, data) for every stored post
+        self.stored_posts = stored_posts
+        # followed_lists(username) yields the post-id lists (each in time
+        # order) of everyone username follows
+        self.followed_lists = followed_lists
+        self._entries = {}
+        self._children = {}     # parent_id -> sorted [sort key of each comment]
+        self._derived = {}      # shared_from -> sorted [sort key of each share/quote]
+        self._engagement = {}   # post_id -> [comments, shares, quotes] it received
+        self._order = []        # (timestamp, post_id) of every post, oldest first
+        self._order_dirty = False
+        self._log = JsonlTail(self.path)
+        self._lines = 0
+
+    # ------------ LOADING ------------
+    def _lock(self):
+        # Held to append, and while a compaction or rebuild swaps the file
+        return file_lock(self.path.with_name(self.path.name + ".lock"))
+
+    def _refresh(self):
+        if not self.path.exists():
+            with self._lock():
+                if not self.path.exists():
+                    self._rebuild()
+
+        self._tail()
+        if self._lines - len(self._entries) > COMPACT_SLACK:
+            self.compact()
+
+    def _tail(self):
+        """Apply the lines appended since the last look."""
+        restarted, entries = self._log.poll()
+        if restarted:
+            # Replaced by a compaction or rebuild → start over
+            self._reset()
+        for entry in entries:
+            self._apply(entry)
+            self._lines += 1
+
+    def _reset(self):
+        self._entries = {}
+        self._children = {}
+        self._derived = {}
+        self._engagement = {}
+        self._order = []
+        self._order_dirty = False
+        self._lines = 0
+
+    @staticmethod
+    def sort_key(entry):
+        return (entry.get("timestamp") or "", entry["post_id"])
+
+    def _apply(self, entry):
+        post_id = entry["post_id"]
+        if post_id not in self._entries:
+            key = self.sort_key(entry)
+            # Posts almost always arrive in time order; sort lazily otherwise
+            if self._order and key < self._order[-1]:
+                self._order_dirty = True
+            self._order.append(key)
+            self._count_engagement(entry)
+            if entry["type"] == "comment" and entry.get("parent_id"):
+                self._link(self._children, entry["parent_id"], key)
+            if entry.get("shared_from"):
+                self._link(self._derived, entry["shared_from"], key)
+        self._entries[post_id] = entry
+
+    @staticmethod
+    def _link(links, target, key):
+        keys = links.setdefault(target, [])
+        if keys and key < keys[-1]:
+            insort(keys, key)
+        else:
+            keys.append(key)
+
+    def _count_engagement(self, entry):
+        """Bump the counters of the post a new comment/share/quote points at."""
+        kind = entry["type"]
+        target = entry.get("parent_id") if kind == "comment" else entry.get("shared_from")
+        if target and kind in ENGAGEMENT_TYPES:
+            counts = self._engagement.setdefault(target, [0, 0, 0])
+            counts[ENGAGEMENT_TYPES.index(kind)] += 1
+
+    def _rebuild(self):
+        """Recreate the catalog from the post files (first run / lost catalog); needs the lock."""
+        lines = [json.dumps(self.make_entry(pid, data)) for pid, data in self.stored_posts()]
+        self._replace(lines)
+
+    def rebuild(self):
+        """Rebuild from the stored posts after they were moved or renamed."""
+        with self._lock():
+            self._rebuild()
+        self._refresh()
+
+    def _replace(self, lines):
+        write_atomic(self.path, "".join(line + "\n" for line in lines))
+
+    def compact(self):
+        """Rewrite the log keeping only the latest entry per post."""
+        with self._lock():
+            # No one can append now: take in every line written so far first
+            self._tail()
+            self._replace([json.dumps(e) for e in self._entries.values()])
+        self._reset()
+        self._log.forget()
+        self._tail()
+
+    # ------------ WRITING ------------
+    @staticmethod
+    def make_entry(post_id, data):
+        entry = {"post_id": post_id}
+        for field in CATALOG_FIELDS:
+            entry[field] = data.get(field)
+        entry["revoked"] = bool(entry["revoked"])
+        entry["type"] = entry["type"] or "post"
+        if not entry["timestamp"] and id_time(post_id):
+            entry["timestamp"] = id_time(post_id).isoformat()
+        return entry
+
+    def record(self, post_id, data):
+        self._refresh()
+        entry = self.make_entry(post_id, data)
+        with self._lock():
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        # Our own line is re-read on the next refresh; applying it twice is harmless
+        self._apply(entry)
+
+    # ------------ QUERIES ------------
+    def refresh(self):
+        """Pick up entries appended by other sessions."""
+        self._refresh()
+
+    def get(self, post_id, refresh=True):
+        """Entry for post_id; pass refresh=False in tight loops after one refresh."""
+        if refresh:
+            self._refresh()
+        return self._entries.get(post_id)
+
+    def _ordered(self):
+        self._refresh()
+        if self._order_dirty:
+            self._order.sort()
+            self._order_dirty = False
+        return self._order
+
+    def entries(self):
+        """All entries, newest first."""
+        return [self._entries[pid] for _, pid in reversed(self._ordered())]
+
+    def iter_older(self, before=None, newest=None):
+        """
+        Entries newest first, strictly older than the `before` sort key and
+        no newer than the `newest` timestamp. Nothing is materialized.
+        """
+        order = self._ordered()
+        if before is not None:
+            i = bisect_left(order, tuple(before))
+        elif newest is not None:
+            # Every key with this timestamp sorts below (newest, <any id>)
+            i = bisect_left(order, (newest + "\uffff",))
+        else:
+            i = len(order)
+        while i > 0:
+            i -= 1
+            if newest is not None and order[i][0] > newest:
+                continue
+            yield self._entries[order[i][1]]
+
+    def _timeline(self, post_ids, before=None, newest=None):
+        """Entries of one author list, newest first, older than `before`."""
+        def key(pid):
+            entry = self._entries.get(pid)
+            return self.sort_key(entry) if entry else ("", pid)
+
+        end = bisect_left(post_ids, tuple(before), key=key) if before else len(post_ids)
+        for i in range(end - 1, -1, -1):
+            entry = self._entries.get(post_ids[i])
+            if entry is None:
+                continue
+            if newest is not None and (entry.get("timestamp") or "") > newest:
+                continue
+            yield entry
+
+    def iter_followed(self, username, before=None, newest=None):
+        """
+        Like iter_older, for the posts of everyone username follows: a lazy
+        k-way merge of their timelines, so the cost depends on who you
+        follow, not global volume.
+        """
+        self._refresh()     # once; the timelines then read without refreshing
+        timelines = [self._timeline(ids, before, newest) for ids in self.followed_lists(username)]
+        return heapq.merge(*timelines, key=self.sort_key, reverse=True)
+
+    def _page(self, keys, limit, cursor):
+        """Slice one page (oldest first) out of a sorted list of sort keys."""
+        if not keys:
+            return [], None
+
+        start = 0
+        if cursor in self._entries:
+            key = self.sort_key(self._entries[cursor])
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                start = i + 1
+
+        page = [post_id for _, post_id in keys[start:start + limit]]
+        more = start + limit < len(keys)
+        return page, (page[-1] if more and page else None)
+
+    def count_comments(self, post_id):
+        self._refresh()
+        return len(self._children.get(post_id, ()))
+
+    def comments(self, post_id, limit, cursor=None):
+        """
+        One page of comment ids for post_id, oldest first.
+        cursor is the last comment id of the previous page.
+        Returns (comment_ids, next_cursor); next_cursor is None on the last page.
+        """
+        self._refresh()
+        return self._page(self._children.get(post_id), limit, cursor)
+
+    def engagement(self, post_ids):
+        """{post_id: (comments, shares, quotes)} received by each of post_ids."""
+        self._refresh()
+        return {pid: tuple(self._engagement.get(pid, (0, 0, 0))) for pid in post_ids}
+
+    def count_derivatives(self, post_id):
+        self._refresh()
+        return len(self._derived.get(post_id, ()))
+
+    def derivatives(self, post_id, limit, cursor=None):
+        """Like comments(), for the shares and quotes of post_id."""
+        self._refresh()
+        return self._page(self._derived.get(post_id), limit, cursor)
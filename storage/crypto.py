@@ -1,43 +1,310 @@
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+import os
+import threading
+from collections import OrderedDict
+
+from cryptography.hazmat.primitives.asymmetric import rsa, padding, x25519, ed25519
 from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from pathlib import Path
 
+import config
+
 USER_DIR = Path.home() / ".beep_storage/users"
-USER_DIR.mkdir(exist_ok=True)
+USER_DIR.mkdir(parents=True, exist_ok=True)
+KEY_POOL_DIR = USER_DIR / "pool"      # pre-generated private keys
+KEY_POOL_DIR.mkdir(exist_ok=True)
+
+PUBLIC_KEY_CACHE = 256    # parsed public keys kept per process
+PRIVATE_KEY_CACHE = 8     # parsed private keys besides the session's own
+NONCE_SIZE = 12           # AES-GCM nonce
+
+# Identity types: "rsa" (RSA-2048 for everything) or "ec" (X25519 for
+# encryption, Ed25519 for signing). Key kinds are what is stored on disk.
+KEY_TYPES = ("rsa", "ec")
+IDENTITY_KINDS = {"rsa": ("rsa",), "ec": ("x25519", "ed25519")}
+
+def _key_files(username, kind):
+    # RSA keeps the original unsuffixed file names
+    suffix = "" if kind == "rsa" else f"_{kind}"
+    return USER_DIR / f"{username}{suffix}_priv.pem", USER_DIR / f"{username}{suffix}_pub.pem"
+
+def _file_stamp(path):
+    st = path.stat()
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _generate(kind):
+    if kind == "rsa":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if kind == "x25519":
+        return x25519.X25519PrivateKey.generate()
+    return ed25519.Ed25519PrivateKey.generate()
+
+def _private_pem(private_key):
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
+def _public_pem(public_key):
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+def key_type(username):
+    """Identity type of an existing user ("rsa"/"ec"), or None without keys."""
+    for identity in ("ec", "rsa"):
+        kind = IDENTITY_KINDS[identity][0]
+        if all(path.exists() for path in _key_files(username, kind)):
+            return identity
+    return None
+
+def create_identity(username, identity=None):
+    """Write a key set for username, taking pre-generated keys when available."""
+    identity = identity or config.KEY_TYPE
+    if identity not in KEY_TYPES:
+        raise ValueError(f"Unknown key type '{identity}' (use {' or '.join(KEY_TYPES)})")
+
+    for kind in IDENTITY_KINDS[identity]:
+        private_key = take_pooled_key(kind) or _generate(kind)
+        priv_file, pub_file = _key_files(username, kind)
+
+        # Save keys
+        priv_file.write_bytes(_private_pem(private_key))
+        pub_file.write_bytes(_public_pem(private_key.public_key()))
+    return identity
+
+# ---------------- KEY POOL ----------------
+
+def take_pooled_key(kind):
+    """Claim one pre-generated private key of this kind, or None."""
+    for path in KEY_POOL_DIR.glob(f"{kind}-*.pem"):
+        claimed = path.with_suffix(".claimed")
+        try:
+            path.rename(claimed)    # atomic: only one session gets it
+        except FileNotFoundError:
+            continue
+        data = claimed.read_bytes()
+        claimed.unlink()
+        return serialization.load_pem_private_key(data, password=None)
+    return None
+
+def fill_key_pool(size=None, identity=None):
+    """Generate keys until the pool holds `size` of each kind the identity needs."""
+    size = config.KEY_POOL_SIZE if size is None else size
+    for kind in IDENTITY_KINDS[identity or config.KEY_TYPE]:
+        missing = size - sum(1 for _ in KEY_POOL_DIR.glob(f"{kind}-*.pem"))
+        for _ in range(missing):
+            tmp = KEY_POOL_DIR / f"{kind}-{os.urandom(8).hex()}.tmp"
+            tmp.write_bytes(_private_pem(_generate(kind)))
+            tmp.replace(tmp.with_suffix(".pem"))
+
+def start_key_pool(size=None):
+    """Top up the key pool in a daemon thread (no-op when the pool is off)."""
+    size = config.KEY_POOL_SIZE if size is None else size
+    if size <= 0:
+        return None
+    thread = threading.Thread(target=fill_key_pool, args=(size,), daemon=True)
+    thread.start()
+    return thread
+
+
+class Keyring:
+    """
+    Process-wide cache of parsed keys.
+    Public (and a few private) keys sit in LRUs that are invalidated when
+    the PEM file changes; the logged-in user's private key is held for
+    the whole session.
+    """
+
+    def __init__(self, max_public=PUBLIC_KEY_CACHE, max_private=PRIVATE_KEY_CACHE):
+        self.max_public = max_public
+        self.max_private = max_private
+        self._public = OrderedDict()    # (username, kind) -> (file stamp, key)
+        self._private = OrderedDict()
+        self.session_user = None
+        self._session_key = None
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()   # shared with decrypt worker threads
+
+    def _lookup(self, cache, limit, cache_key, path, parse):
+        stamp = _file_stamp(path)
+        with self._lock:
+            entry = cache.get(cache_key)
+            if entry and entry[0] == stamp:
+                cache.move_to_end(cache_key)
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+
+        key = parse(path.read_bytes())
+        with self._lock:
+            cache[cache_key] = (stamp, key)
+            cache.move_to_end(cache_key)
+            while len(cache) > limit:
+                cache.popitem(last=False)
+        return key
+
+    def _kind(self, username, signing=False):
+        """Key kind used by username for encryption (or signing), creating keys if needed."""
+        identity = key_type(username) or create_identity(username)
+        kinds = IDENTITY_KINDS[identity]
+        if signing:
+            return kinds[1] if len(kinds) > 1 else None
+        return kinds[0]
+
+    def _public_key(self, username, kind):
+        _, pub_file = _key_files(username, kind)
+        return self._lookup(
+            self._public, self.max_public, (username, kind), pub_file,
+            serialization.load_pem_public_key,
+        )
+
+    def _private_key(self, username, kind):
+        priv_file, _ = _key_files(username, kind)
+        return self._lookup(
+            self._private, self.max_private, (username, kind), priv_file,
+            lambda data: serialization.load_pem_private_key(data, password=None),
+        )
+
+    def public_key(self, username):
+        """Encryption public key (RSA or X25519)."""
+        return self._public_key(username, self._kind(username))
+
+    def private_key(self, username):
+        if username == self.session_user and self._session_key is not None:
+            self.stats["hits"] += 1
+            return self._session_key
+        return self._private_key(username, self._kind(username))
+
+    def signing_key(self, username):
+        """Ed25519 private key, or None for RSA identities."""
+        kind = self._kind(username, signing=True)
+        return self._private_key(username, kind) if kind else None
+
+    def verify_key(self, username):
+        kind = self._kind(username, signing=True)
+        return self._public_key(username, kind) if kind else None
+
+    def unlock(self, username):
+        """Hold username's private key for the rest of the session."""
+        self.session_user = username
+        self._session_key = None
+        self._session_key = self.private_key(username)
+
+    def lock(self):
+        self.session_user = None
+        self._session_key = None
+
+
+keyring = Keyring()
 
 def load_or_create_keys(username):
     """
     Returns (private_key, public_key) for a given username.
     Generates a new key pair if not exists.
     """
-    priv_file = USER_DIR / f"{username}_priv.pem"
-    pub_file = USER_DIR / f"{username}_pub.pem"
-
-    if priv_file.exists() and pub_file.exists():
-        # Load existing keys
-        private_key = serialization.load_pem_private_key(
-            priv_file.read_bytes(),
-            password=None
-        )
-        public_key = serialization.load_pem_public_key(pub_file.read_bytes())
-    else:
-        # Generate new keys
-        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-        public_key = private_key.public_key()
+    return keyring.private_key(username), keyring.public_key(username)
 
-        # Save keys
-        priv_file.write_bytes(
-            private_key.private_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-        )
-        pub_file.write_bytes(
-            public_key.public_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PublicFormat.SubjectPublicKeyInfo
-            )
-        )
 
-    return private_key, public_key
+# ---------------- RSA-OAEP ----------------
+
+def _oaep():
+    return padding.OAEP(
+        mgf=padding.MGF1(algorithm=hashes.SHA256()),
+        algorithm=hashes.SHA256(),
+        label=None
+    )
+
+def rsa_encrypt(public_key, data):
+    return public_key.encrypt(data, _oaep())
+
+def rsa_decrypt(private_key, blob):
+    return private_key.decrypt(blob, _oaep())
+
+# ---------------- X25519 SEALED BOXES ----------------
+# ECIES-style: ephemeral X25519 agreement -> HKDF-SHA256 -> AES-256-GCM.
+# Layout: ephemeral public key (32) | nonce (12) | ciphertext.
+
+def _box_key(shared, ephemeral_pub, recipient_pub):
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"beep-sealed-box" + ephemeral_pub + recipient_pub,
+    ).derive(shared)
+
+def _raw(public_key):
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+
+def box_seal(public_key, data):
+    ephemeral = x25519.X25519PrivateKey.generate()
+    ephemeral_pub = _raw(ephemeral.public_key())
+    key = _box_key(ephemeral.exchange(public_key), ephemeral_pub, _raw(public_key))
+    nonce = os.urandom(NONCE_SIZE)
+    return ephemeral_pub + nonce + AESGCM(key).encrypt(nonce, data, None)
+
+def box_open(private_key, blob):
+    ephemeral_pub, nonce, ciphertext = blob[:32], blob[32:32 + NONCE_SIZE], blob[32 + NONCE_SIZE:]
+    shared = private_key.exchange(x25519.X25519PublicKey.from_public_bytes(ephemeral_pub))
+    key = _box_key(shared, ephemeral_pub, _raw(private_key.public_key()))
+    return AESGCM(key).decrypt(nonce, ciphertext, None)
+
+# ---------------- PER-USER ENCRYPTION ----------------
+# Dispatch on the recipient's identity, so RSA and EC members can share a room.
+
+def encrypt_for(username, data):
+    public_key = keyring.public_key(username)
+    if isinstance(public_key, x25519.X25519PublicKey):
+        return box_seal(public_key, data)
+    return rsa_encrypt(public_key, data)
+
+def decrypt_for(username, blob):
+    private_key = keyring.private_key(username)
+    if isinstance(private_key, x25519.X25519PrivateKey):
+        return box_open(private_key, blob)
+    return rsa_decrypt(private_key, blob)
+
+def sign(username, data):
+    """Ed25519 signature as hex, or None for RSA identities."""
+    signing_key = keyring.signing_key(username)
+    return signing_key.sign(data).hex() if signing_key else None
+
+def signs(username):
+    """Whether username's identity signs what it sends (EC identities do)."""
+    return key_type(username) == "ec"
+
+def verify(username, data, signature):
+    """Raises cryptography's InvalidSignature on a bad signature."""
+    verify_key = keyring.verify_key(username)
+    if verify_key is None:
+        raise ValueError(f"User '{username}' has no signing key")
+    verify_key.verify(bytes.fromhex(signature), data)
+
+# ---------------- CONTENT KEYS ----------------
+# Room/chat messages are encrypted once with a shared AES-256-GCM key;
+# only that key is wrapped, once per member.
+
+def new_content_key():
+    return AESGCM.generate_key(bit_length=256)
+
+def wrap_key(username, key):
+    """Encrypt a content key for one user; returns hex."""
+    return encrypt_for(username, key).hex()
+
+def unwrap_key(username, wrapped):
+    return decrypt_for(username, bytes.fromhex(wrapped))
+
+def seal(key, plaintext, aad=None):
+    """AES-GCM encrypt; returns hex of nonce + ciphertext."""
+    nonce = os.urandom(NONCE_SIZE)
+    return (nonce + AESGCM(key).encrypt(nonce, plaintext, aad)).hex()
+
+def unseal(key, sealed, aad=None):
+    blob = bytes.fromhex(sealed)
+    return AESGCM(key).decrypt(blob[:NONCE_SIZE], blob[NONCE_SIZE:], aad)
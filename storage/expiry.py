@@ -0,0 +1,94 @@
+import heapq
+import json
+import threading
+from pathlib import Path
+
+from storage.locks import file_lock
+from storage.fileio import write_json
+
+
+class ExpiryIndex:
+    """
+    Min-heap of (expires_at, room name) for ephemeral rooms, kept in one
+    JSON file next to the rooms. The soonest expiry is always at the
+    front, so finding or sweeping expired rooms touches only those rooms.
+    """
+
+    def __init__(self, path, scan):
+        self.path = Path(path)
+        # scan() yields (expires_at, name) of every ephemeral room on disk
+        self.scan = scan
+        self._stamp = None
+        self._heap = []
+        # The room sweeper thread and the main thread share the cached heap
+        self._mutex = threading.Lock()
+
+    def _lock(self):
+        return file_lock(self.path.with_name(self.path.name + ".lock"))
+
+    def _ensure(self):
+        if self.path.exists():
+            return
+        # First use: index the ephemeral rooms created before the index existed
+        with self._lock():
+            if not self.path.exists():
+                heap = [[expires_at, name] for expires_at, name in self.scan()]
+                heapq.heapify(heap)
+                self._save(heap)
+
+    def _load(self):
+        """The cached heap, reread if the file changed; caller holds _mutex."""
+        st = self.path.stat()
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp != self._stamp:
+            self._heap = json.loads(self.path.read_text())
+            self._stamp = stamp
+        return self._heap
+
+    def _save(self, heap):
+        write_json(self.path, heap)
+
+    def set(self, name, expires_at):
+        """Track a room's expiry (None = not ephemeral), replacing any old entry."""
+        self._ensure()
+        with self._lock(), self._mutex:
+            heap = self._load()
+            stale = any(entry[1] == name for entry in heap)
+            if stale:
+                heap = [entry for entry in heap if entry[1] != name]
+                heapq.heapify(heap)
+            if expires_at is not None:
+                heapq.heappush(heap, [expires_at, name])
+            if stale or expires_at is not None:
+                self._save(heap)
+
+    def expired(self, now):
+        """Names of rooms expired at `now`; only the expired part of the heap is visited."""
+        self._ensure()
+        with self._mutex:
+            heap = self._load()
+            names, stack = set(), [0]
+            while stack:
+                i = stack.pop()
+                if i < len(heap) and heap[i][0] <= now:
+                    names.add(heap[i][1])
+                    stack.extend((2 * i + 1, 2 * i + 2))
+        return names
+
+    def pop_expired(self, now):
+        """Remove and return the names of every room expired at `now`."""
+        self._ensure()
+        with self._lock(), self._mutex:
+            heap = self._load()
+            names = []
+            while heap and heap[0][0] <= now:
+                names.append(heapq.heappop(heap)[1])
+            if names:
+                self._save(heap)
+        return names
+
+    def next_expiry(self):
+        self._ensure()
+        with self._mutex:
+            heap = self._load()
+            return heap[0][0] if heap else None
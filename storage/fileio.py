@@ -0,0 +1,83 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+
+def write_atomic(path, text):
+    """Replace path with text in one step: readers see the old file or the new one."""
+    path = Path(path)
+    # One temp file per writer, so concurrent writers never clobber each other's
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_text(text)
+    tmp.replace(path)
+
+
+def write_json(path, data, **dumps_args):
+    write_atomic(path, json.dumps(data, **dumps_args))
+
+
+class JsonlTail:
+    """
+    Incremental reader of an append-only JSON-lines file that other
+    sessions append to and may replace wholesale (compaction, rebuild).
+
+    The file being read is kept open: an inode cannot be reused while it
+    is open, so comparing inodes reliably tells a replaced file apart
+    from a grown one.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+        self._offset = 0
+
+    def forget(self):
+        """Read the file from the start on the next poll."""
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._offset = 0
+
+    def poll(self):
+        """
+        (restarted, records): the records appended since the last poll.
+        restarted is True when the file was replaced (or first read); the
+        records then start at the top of the new file, so the caller drops
+        whatever it built from the old one.
+        """
+        restarted = False
+        try:
+            st = self.path.stat()
+            if self._file is None or os.fstat(self._file.fileno()).st_ino != st.st_ino:
+                self.forget()
+                self._file = open(self.path, "rb")
+                restarted = True
+        except FileNotFoundError:
+            restarted = self._file is not None
+            self.forget()
+            return restarted, []
+
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self._offset:
+            # Truncated in place → read it again from the top
+            self._offset = 0
+            restarted = True
+        if size == self._offset:
+            return restarted, []
+
+        self._file.seek(self._offset)
+        chunk = self._file.read(size - self._offset)
+
+        # Only consume complete lines; a concurrent writer may be mid-line
+        end = chunk.rfind(b"\n") + 1
+        records = []
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        self._offset += end
+        return restarted, records
@@ -1,27 +1,148 @@
 import time
 import json
 import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from datetime import datetime
-
-from storage.crypto import load_or_create_keys
-from storage.profile import get_user, update_user
-
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives import hashes
+from datetime import datetime, timedelta
+
+from storage.crypto import (
+    encrypt_for, decrypt_for, sign, signs, verify,
+    new_content_key, wrap_key, unwrap_key, seal, unseal,
+)
+from storage.profile import get_user, user_list, append_to_user, update_user, user_index
+from storage.catalog import PostCatalog
+from storage.packs import PackStore
+from storage.shards import FilePostStore
+from storage.roomstore import FileRoomStore
+from storage.sqlite_store import SqlitePostStore, SqliteRoomStore, DB_NAME
+from storage.search import SearchIndex
+from storage.trending import TrendingTags, extract_tags
+from storage.ranking import score_posts
+from storage.inbox import ChatInbox, RoomCursors
+from storage.expiry import ExpiryIndex
+from storage.backfill import Backfill
+from storage.locks import file_lock
+from storage.fileio import write_json
+from storage.ids import new_post_id, is_time_ordered
+import config
 
 # ---------------- PATHS ----------------
 
 STORAGE_DIR = Path.home() / ".beep_storage"
-POSTS_DIR = STORAGE_DIR / "posts"
+POSTS_DIR = STORAGE_DIR / "posts"     # sharded by day: posts/YYYY/MM/DD/<id>.json
 ROOMS_DIR = STORAGE_DIR / "rooms"
 USER_DIR = STORAGE_DIR / "users"      # crypto keys only
 CHATS_DIR = STORAGE_DIR / "chats"
-
-for path in (STORAGE_DIR, POSTS_DIR, ROOMS_DIR, USER_DIR, CHATS_DIR):
+INBOX_DIR = STORAGE_DIR / "inbox"   # per-user index of DM chats
+LOGS_DIR = STORAGE_DIR / "logs"     # append-only message logs per room/chat
+JOBS_DIR = STORAGE_DIR / "jobs"     # checkpoints of background history backfills
+PACKS_DIR = STORAGE_DIR / "packs"     # post packs of the "pack" backend
+CATALOG_FILE = STORAGE_DIR / "posts_catalog.jsonl"
+SEARCH_FILE = STORAGE_DIR / "search_index.jsonl"
+TRENDING_DIR = STORAGE_DIR / "trending"     # decayed hashtag/mention counters
+DB_FILE = STORAGE_DIR / DB_NAME     # database of the "sqlite" backend
+ALIASES_FILE = STORAGE_DIR / "post_aliases.json"   # legacy post id -> time-ordered id
+
+for path in (STORAGE_DIR, POSTS_DIR, ROOMS_DIR, USER_DIR, CHATS_DIR, LOGS_DIR, JOBS_DIR):
     path.mkdir(exist_ok=True)
 
 PAGE = 10
+COMMENTS_PAGE = 5
+LINEAGE_DEPTH = 4       # share/quote levels shown under a post
+LINEAGE_FANOUT = 5      # derivatives expanded per node
+LINEAGE_NODES = 50      # total nodes per lineage walk
+PLAINTEXT_CACHE = 2000  # decrypted messages kept per session
+RANKED_WINDOW = 72      # hours of posts considered for the ranked feed
+RANKED_CANDIDATES = 500 # newest posts in that window that get scored
+
+# Per-author lists kept on each profile, all in append (= time) order
+TIMELINE_FIELDS = ("posts", "shared", "comments")
+
+def _followed_lists(username):
+    """The timeline lists of everyone username follows."""
+    users = user_index()
+    for author in user_list(username, "following"):
+        if author not in users:
+            continue
+        for field in TIMELINE_FIELDS:
+            post_ids = user_list(author, field)
+            if post_ids:
+                yield post_ids
+
+# The post and room stores of the configured backend (config.STORAGE_BACKEND),
+# shared by every BeepFS instance. The JSON files always exist: they are the
+# "files" backend and hold what was saved before packs or the database.
+post_files = FilePostStore(POSTS_DIR)
+file_rooms = FileRoomStore(STORAGE_DIR)
+
+if config.STORAGE_BACKEND == "sqlite":
+    # The database also answers the catalog queries
+    post_store = catalog = SqlitePostStore(DB_FILE, post_files.items)
+    room_store = SqliteRoomStore(DB_FILE, LOGS_DIR, file_rooms)
+    stored_posts = post_store.items
+else:
+    post_store = PackStore(PACKS_DIR, post_files) if config.STORAGE_BACKEND == "pack" else post_files
+    room_store = file_rooms
+
+    def stored_posts():
+        """(post_id, data) of every stored post; packed copies come last and win."""
+        yield from post_files.items()
+        if post_store is not post_files:
+            yield from post_store.items()
+
+    catalog = PostCatalog(CATALOG_FILE, stored_posts, _followed_lists)
+
+# Full-text index over post content, rebuilt from whichever store holds the posts
+search_index = SearchIndex(SEARCH_FILE, stored_posts)
+
+trending = TrendingTags(TRENDING_DIR)
+
+# Alias map of migrated post ids, reloaded when the file changes
+_aliases = {"stamp": None, "ids": {}}
+
+def resolve_post_id(post_id):
+    """Map a pre-migration post id to its current id (others pass through)."""
+    if not post_id or is_time_ordered(post_id):
+        return post_id
+    try:
+        st = ALIASES_FILE.stat()
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return post_id
+    if stamp != _aliases["stamp"]:
+        _aliases["ids"] = json.loads(ALIASES_FILE.read_text())
+        _aliases["stamp"] = stamp
+    return _aliases["ids"].get(post_id, post_id)
+
+def _ephemeral_rooms():
+    """(expires_at, name) of every stored ephemeral room."""
+    for name in room_store.names("rooms"):
+        try:
+            room = room_store.get("rooms", name)
+        except (OSError, ValueError):
+            continue
+        if room and room.get("ephemeral") and room.get("expires_at"):
+            yield room["expires_at"], name
+
+# Expiry times of ephemeral rooms, soonest first
+room_expiry = ExpiryIndex(ROOMS_DIR / "expiry.idx", _ephemeral_rooms)
+
+inbox = ChatInbox(INBOX_DIR)
+room_cursors = RoomCursors(INBOX_DIR / "rooms")
+
+# Unwrapped content keys for this session: (log dir, epoch, user) ->
+# (stamp of the wrapped-key file, key); a recreated room gets new files
+_content_keys = {}
+
+# Newest key epoch per log dir, so sending needs no directory scan
+_current_epochs = {}
+
+# Decrypted messages for this session: (user, message id) -> message
+_plaintexts = OrderedDict()
+_plaintexts_lock = threading.Lock()
 
 # ================= FILESYSTEM =================
 
@@ -36,50 +157,179 @@ class BeepFS:
 
     @staticmethod
     def _write_json(path, data):
-        with open(path, "w") as f:
-            json.dump(data, f, indent=4)
+        # Atomic, so concurrent readers never see a half-written file
+        write_json(path, data, indent=4)
+
+    @staticmethod
+    def _move_messages_to_log(container, log):
+        """
+        Move messages still embedded in an old room/chat file into its log.
+        They are dropped from the container only once all of them are in
+        the log; the caller then rewrites the file.
+        """
+        # Messages an interrupted or concurrent move already appended are skipped
+        log.append_missing(container.get("messages", []))
+        del container["messages"]
 
     # ---------------- POSTS ----------------
     def list_posts(self, only_existing_users=True):
-        posts = sorted((p.stem for p in POSTS_DIR.glob("*.json")), reverse=True)
+        """Post ids, newest first, answered from the catalog."""
+        entries = catalog.entries()
         if only_existing_users:
-            valid_posts = []
-            for pid in posts:
-                post = self.read_post(pid)
-                creator = post.get("creator")
-                if creator and get_user(creator):
-                    valid_posts.append(pid)
-            return valid_posts
-        return posts
+            users = user_index()
+            entries = [e for e in entries if e["creator"] and e["creator"] in users]
+        return [e["post_id"] for e in entries]
 
     def list_followed_posts(self, username):
-        user = get_user(username)
-        if not user:
-            return []
-        followed = set(user.get("following", []))
-        posts = self.list_posts(only_existing_users=True)
-        return [
-            post_id
-            for post_id in posts
-            if self.read_post(post_id).get("creator") in followed
-        ]
+        return [e["post_id"] for e in self._followed_timeline(username)]
+
+    def _followed_timeline(self, username, before=None, newest=None):
+        """Catalog entries of everyone username follows, newest first, lazily."""
+        return catalog.iter_followed(username, before, newest)
+
+    # ---------------- FEED PAGES ----------------
+    def new_feed_cursor(self):
+        """Cursor for the first page of a feed, pinned to posts existing right now."""
+        return {"before": None, "watermark": datetime.now().isoformat()}
+
+    def page_posts(self, cursor=None, limit=PAGE, followed_by=None):
+        """
+        The next `limit` post ids older than cursor, newest first, from the
+        global feed or (followed_by=username) the followed feed.
+        Returns (post_ids, next_cursor).
+        """
+        cursor = cursor or self.new_feed_cursor()
+        if "ranked" in cursor:
+            start = cursor["offset"]
+            page = cursor["ranked"][start:start + limit]
+            return page, dict(cursor, offset=start + len(page))
+        if followed_by:
+            entries = self._followed_timeline(followed_by, cursor["before"], cursor["watermark"])
+        else:
+            users = user_index()
+            entries = (
+                e for e in catalog.iter_older(cursor["before"], cursor["watermark"])
+                if e["creator"] in users
+            )
+        # islice stops the lazy walk/merge as soon as the page is full
+        page = list(islice(entries, limit))
+        if not page:
+            return [], cursor
+
+        last = page[-1]
+        next_cursor = dict(cursor, before=[last.get("timestamp") or "", last["post_id"]])
+        return [e["post_id"] for e in page], next_cursor
+
+    def rank_feed(self, username=None, now=None):
+        """
+        Post ids of the ranked ("foryou") feed, best first. Only the newest
+        RANKED_CANDIDATES posts of the last RANKED_WINDOW hours are scored,
+        using the catalog's materialized engagement counters.
+        """
+        now = now or datetime.now()
+        oldest = (now - timedelta(hours=RANKED_WINDOW)).isoformat()
+        users = user_index()
+        candidates = []
+        for entry in catalog.iter_older(newest=now.isoformat()):
+            if (entry.get("timestamp") or "") < oldest or len(candidates) >= RANKED_CANDIDATES:
+                break
+            if entry["type"] == "comment" or entry["revoked"] or entry["creator"] not in users:
+                continue
+            candidates.append(entry)
+
+        followed = user_list(username, "following") if username else []
+        engagement = catalog.engagement([e["post_id"] for e in candidates])
+        return [e["post_id"] for _, e in score_posts(candidates, engagement, followed, username, now)]
+
+    def new_ranked_cursor(self, username=None):
+        """Cursor over a ranking computed once, so paging never reshuffles it."""
+        return {"ranked": self.rank_feed(username), "offset": 0}
+
+    def get_comments(self, post_id, limit=COMMENTS_PAGE, cursor=None):
+        """Page through the comments of a post: returns (comment_ids, next_cursor)."""
+        return catalog.comments(resolve_post_id(post_id), limit, resolve_post_id(cursor))
+
+    def count_comments(self, post_id):
+        return catalog.count_comments(resolve_post_id(post_id))
+
+    def get_derivatives(self, post_id, limit=LINEAGE_FANOUT, cursor=None):
+        """Page through the shares/quotes of a post: returns (post_ids, next_cursor)."""
+        return catalog.derivatives(resolve_post_id(post_id), limit, resolve_post_id(cursor))
+
+    def count_derivatives(self, post_id):
+        return catalog.count_derivatives(resolve_post_id(post_id))
+
+    def walk_lineage(self, post_id, max_depth=LINEAGE_DEPTH, fanout=LINEAGE_FANOUT, max_nodes=LINEAGE_NODES):
+        """
+        Lazily walk the share/quote tree below post_id (depth first).
+        Yields (depth, post_id, derivative_count, hidden_count) where
+        hidden_count is how many derivatives of that node were not expanded.
+        """
+        stack = [(0, resolve_post_id(post_id))]
+        seen = set()
+        while stack and max_nodes > 0:
+            depth, pid = stack.pop()
+            if pid in seen:
+                continue
+            seen.add(pid)
+            max_nodes -= 1
+
+            total = catalog.count_derivatives(pid)
+            expand = []
+            if depth < max_depth and total:
+                expand, _ = catalog.derivatives(pid, fanout)
+            yield depth, pid, total, total - len(expand)
+            stack.extend((depth + 1, child) for child in reversed(expand))
+
+    def search(self, query, limit=PAGE):
+        """Post ids matching every term of query, best first ("term*" matches a prefix)."""
+        return [pid for pid, _ in search_index.search(query, limit)]
+
+    def trending_tags(self, limit=PAGE, kind=None):
+        """Heaviest recent hashtags/mentions as [(tag, decayed count)]; kind "#" or "@"."""
+        return trending.top_tags(limit, kind)
+
+    def list_user_posts(self, username):
+        return list(user_list(username, "posts"))
+
+    def list_user_shared(self, username):
+        return list(user_list(username, "shared"))
+
+    def post_info(self, post_id):
+        """Catalog entry (metadata without content) for a post, or None."""
+        return catalog.get(resolve_post_id(post_id))
 
     def post_path(self, post_id):
-        return POSTS_DIR / f"{post_id}.json"
+        """Where a post file is written (its day shard)."""
+        return post_files.path(resolve_post_id(post_id))
 
     def read_post(self, post_id):
-        return self._read_json(
-            self.post_path(post_id),
-            default={
-                "creator": None,
-                "content": "[missing]",
-                "revoked": True,
-                "shared_from": None
-            },
-        )
+        return self.read_posts([post_id])[post_id]
+
+    def read_posts(self, post_ids):
+        """
+        Read many posts at once: returns {requested id: post}. Each distinct
+        post is read once; posts saved before the store existed are found
+        in their files.
+        """
+        wanted = {pid: resolve_post_id(pid) for pid in post_ids if pid}
+        unique = list(dict.fromkeys(wanted.values()))
+
+        found = post_store.get_many(unique)
+        cold = [pid for pid in unique if pid not in found]
+        if cold and post_store is not post_files:
+            found.update(post_files.get_many(cold))
+        missing = {"creator": None, "content": "[missing]", "revoked": True, "shared_from": None}
+        return {pid: found.get(real, dict(missing)) for pid, real in wanted.items()}
 
     def save_post(self, post_id, data):
-        self._write_json(self.post_path(post_id), data)
+        post_store.put(resolve_post_id(post_id), data)
+        catalog.record(post_id, data)
+        search_index.add(resolve_post_id(post_id), data)
+
+    def migrate_to_shards(self):
+        """Move flat post files into their day shards; safe while the app runs."""
+        return post_files.migrate_to_shards()
 
     # ---------------- UPDATED CREATE_POST ----------------
     def create_post(self, creator, content, shared_from=None, quote=False, post_type="post", parent_id=None):
@@ -92,11 +342,13 @@ class BeepFS:
         - post_type: "post", "comment", "share", "quote"
         - parent_id: parent post id for comments
         """
-        user = get_user(creator)
-        if not user:
+        if not self.user_exists(creator):
             raise ValueError(f"User '{creator}' does not exist")
 
-        post_id = f"post{uuid.uuid4().hex[:8]}"
+        # Time-ordered, so id order is creation order
+        post_id = new_post_id()
+        shared_from = resolve_post_id(shared_from)
+        parent_id = resolve_post_id(parent_id)
         post_data = {
             "creator": creator,
             "content": content,
@@ -110,6 +362,10 @@ class BeepFS:
 
         self.save_post(post_id, post_data)
 
+        # Shares repeat the original's text, so only new text counts as a mention
+        if post_type != "share":
+            trending.record(extract_tags(content))
+
         # Save reference in user profile
         if post_type == "comment":
             target = "comments"
@@ -118,50 +374,159 @@ class BeepFS:
         else:
             target = "posts"
 
-        user.setdefault(target, []).append(post_id)
-        update_user(creator, user)
+        append_to_user(creator, target, post_id)
 
         return post_id
 
     def delete_post(self, post_id, username):
+        post_id = resolve_post_id(post_id)
         post = self.read_post(post_id)
         if post.get("creator") != username:
             raise PermissionError("Cannot delete another user's post")
         post["revoked"] = True
         self.save_post(post_id, post)
 
+    def prepare_storage(self):
+        """
+        Startup work of the configured backend: import the JSON files on
+        the first SQLite start, shard flat post files, or run the pack
+        compactor (the last two on daemon threads).
+        """
+        room_store.prepare()
+        return post_store.prepare()
+
+    def migrate_post_ids(self):
+        """
+        One-shot move of random legacy ids (post + 8 hex) to time-ordered
+        ids: renames the files, rewrites parent/share references and
+        profile lists, and records old -> new in the alias map so old ids
+        keep working. The mapping is written before anything moves, so an
+        interrupted run resumes with the same ids.
+        """
+        if ALIASES_FILE.exists():
+            return 0
+        pending = ALIASES_FILE.with_name(ALIASES_FILE.name + ".pending")
+        with file_lock(STORAGE_DIR / ".migrate.lock"):
+            if ALIASES_FILE.exists():
+                return 0
+            aliases = self._read_json(pending, default={})
+            taken = set(aliases.values())
+            for path in POSTS_DIR.glob("*.json"):
+                old = path.stem
+                if is_time_ordered(old) or old in aliases:
+                    continue
+                data = self._read_json(path)
+                try:
+                    created = datetime.fromisoformat(data["timestamp"]).timestamp()
+                except (KeyError, TypeError, ValueError):
+                    created = path.stat().st_mtime
+                new = new_post_id(created)
+                while new in taken:
+                    new = new_post_id(created)
+                taken.add(new)
+                aliases[old] = new
+            self._write_json(pending, aliases)
+
+            for path in POSTS_DIR.glob("*.json"):
+                data = self._read_json(path)
+                changed = False
+                for field in ("parent_id", "shared_from"):
+                    if data.get(field) in aliases:
+                        data[field] = aliases[data[field]]
+                        changed = True
+                target = POSTS_DIR / f"{aliases.get(path.stem, path.stem)}.json"
+                if changed or target != path:
+                    self._write_json(target, data)
+                if target != path:
+                    path.unlink()
+
+            for username in user_index():
+                user = get_user(username)
+                if not user:
+                    continue
+                lists = {
+                    field: [aliases.get(pid, pid) for pid in user[field]]
+                    for field in TIMELINE_FIELDS if user.get(field)
+                }
+                if any(lists[f] != user[f] for f in lists):
+                    update_user(username, lists)
+
+            catalog.rebuild()
+            search_index.rebuild()
+            pending.replace(ALIASES_FILE)
+        return len(aliases)
+
     # ---------------- USERS ----------------
     def user_exists(self, username):
-        return get_user(username) is not None
+        return username in user_index()
 
     # ---------------- ROOMS ----------------
     def room_path(self, name):
-        return ROOMS_DIR / f"{name}.json"
+        """Where a room file lives on the "files" backend."""
+        return file_rooms.path("rooms", name)
+
+    def room_log(self, name):
+        return room_store.log("rooms", name)
 
     def list_rooms(self):
-        return sorted((p.stem for p in ROOMS_DIR.glob("*.json")))
+        """Room names, leaving out expired rooms without opening any room record."""
+        expired = room_expiry.expired(time.time())
+        return [name for name in room_store.names("rooms") if name not in expired]
+
+    def _delete_room(self, name):
+        room_store.delete("rooms", name)
+
+    def sweep_expired_rooms(self, now=None):
+        """Delete every expired ephemeral room and its message log; returns their names."""
+        now = now or time.time()
+        swept = []
+        for name in room_expiry.pop_expired(now):
+            room = room_store.get("rooms", name)
+            # The index may be stale: the name could belong to a newer room by now
+            if room and room.get("ephemeral") and room["expires_at"] <= now:
+                self._delete_room(name)
+                swept.append(name)
+        return swept
+
+    def start_room_sweeper(self, interval=None):
+        """Sweep now, then again at the next expiry or every interval seconds, whichever is sooner."""
+        interval = interval or config.ROOM_SWEEP_INTERVAL
+
+        def loop():
+            while True:
+                self.sweep_expired_rooms()
+                next_expiry = room_expiry.next_expiry()
+                wait = interval if next_expiry is None else min(interval, next_expiry - time.time())
+                time.sleep(max(wait, 1))
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
 
     def _write_room(self, room):
-        self.room_path(room["name"]).write_text(json.dumps(room, indent=4))
+        room_store.put("rooms", room["name"], room)
 
     def _read_room(self, name):
-        path = self.room_path(name)
-        if not path.exists():
+        room = room_store.get("rooms", name)
+        if room is None:
             return None
 
-        room = json.loads(path.read_text())
-
         if room.get("ephemeral") and time.time() > room["expires_at"]:
-            path.unlink(missing_ok=True)
+            self._delete_room(name)
             return None
 
+        if "messages" in room:
+            self._move_messages_to_log(room, self.room_log(name))
+            self._write_room(room)
+
         return room
 
     def create_room(self, name, creator, private=False, ttl=None):
         if not self.user_exists(creator):
             raise ValueError(f"User '{creator}' does not exist")
 
-        if self.room_path(name).exists():
+        # Reading drops an expired room, so its name can be reused right away
+        if self._read_room(name) is not None:
             raise ValueError("Room exists")
 
         room = {
@@ -173,13 +538,14 @@ class BeepFS:
                 "invites": [],
                 "banned": [],
                 "muted": {},
-                "messages": [],
                 "ephemeral": bool(ttl),
                 "expires_at": time.time() + ttl if ttl else None,
+                "created_at": time.time(),
         }
 
 
         self._write_room(room)
+        room_expiry.set(name, room["expires_at"])
 
     def join_room(self, name, user, re_encrypt_old=False):
         if not self.user_exists(user):
@@ -197,8 +563,17 @@ class BeepFS:
 
         if user not in room["members"]:
             room["members"].append(user)
+            log = self.room_log(name)
             if re_encrypt_old:
-                self._encrypt_old_messages_for_new_user(room, user)
+                self._grant_old_keys(log, user)
+                self._write_room(room)
+                # Older per-member messages are re-encrypted in the background
+                self._start_backfill("rooms", name, user)
+            else:
+                # New members only read what is sent after they joined
+                self._write_room(room)
+                self._add_member_key(log, room["members"], user)
+            return
 
         self._write_room(room)
 
@@ -212,6 +587,10 @@ class BeepFS:
 
         self._write_room(room)
 
+    def rotate_room_key(self, room):
+        """Start a new key epoch for the current members (e.g. after a kick)."""
+        self._rotate_key(self.room_log(room["name"]), room["members"])
+
     # ---------------- ROOM MESSAGES ----------------
     def say(self, room_name, sender, message):
         room = self._read_room(room_name)
@@ -230,67 +609,80 @@ class BeepFS:
                 del room["muted"][sender]
                 self._write_room(room)
 
+        self._append_message(self.room_log(room_name), room["members"], sender, message)
 
-        msg_bytes = message.encode()
-        encrypted = {}
-
-        for member in room["members"]:
-            _, pub_key = load_or_create_keys(member)
-            encrypted_blob = pub_key.encrypt(
-                msg_bytes,
-                padding.OAEP(
-                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None
-                )
-            )
-            encrypted[member] = encrypted_blob.hex()
-
-        room["messages"].append({
-            "sender": sender,
-            "timestamp": int(time.time()),
-            "encrypted": encrypted
-        })
-
-        self._write_room(room)
-
-    def read_messages(self, room_name, username, start=0, limit=10):
+    def read_messages(self, room_name, username, limit=10, new=False):
+        """
+        The latest `limit` messages username can read (oldest first), the
+        whole history when limit is None, or (new=True) only those after
+        the user's read cursor. Returns (messages, total records) and moves
+        the cursor to the end.
+        """
         room = self._read_room(room_name)
         if not room or username not in room["members"]:
             return [], 0
 
-        private_key, _ = load_or_create_keys(username)
-        visible = []
-
-        for msg in room["messages"]:
-            if username not in msg["encrypted"]:
-                continue
-            try:
-                decrypted = private_key.decrypt(
-                    bytes.fromhex(msg["encrypted"][username]),
-                    padding.OAEP(
-                        mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                        algorithm=hashes.SHA256(),
-                        label=None
-                    )
-                )
-                visible.append({
-                    "sender": msg["sender"],
-                    "timestamp": msg["timestamp"],
-                    "content": decrypted.decode()
-                })
-            except:
+        log = self.room_log(room_name)
+        if new:
+            start = room_cursors.get(username, room_name, room.get("created_at"))
+            messages, total = self._read_from(log, username, start)
+        else:
+            messages, total = self._read_log(log, username, limit)
+        room_cursors.advance(username, room_name, total, room.get("created_at"))
+        return messages, total
+
+    def unread_rooms(self, username):
+        """{room: unread count} for rooms the user has read before; no decryption."""
+        unread = {}
+        for name, (created_at, seen) in room_cursors.all(username).items():
+            room = room_store.get("rooms", name)
+            if room is None:
                 continue
-
-        total = len(visible)
-        return visible[start:start + limit], total
+            # A cursor left by an earlier room of the same name does not count
+            if room.get("created_at") != created_at:
+                seen = 0
+            unread[name] = max(len(self.room_log(name)) - seen, 0)
+        return unread
 
     # ---------------- CHATS (DMs) ----------------
     def chat_path(self, name):
-        return CHATS_DIR / f"{name}.json"
+        """Where a chat file lives on the "files" backend."""
+        return file_rooms.path("chats", name)
+
+    def chat_log(self, name):
+        return room_store.log("chats", name)
 
     def list_chats(self):
-        return sorted((c.stem for c in CHATS_DIR.glob("*.json")))
+        return room_store.names("chats")
+
+    def list_inbox(self, user):
+        """
+        The user's chats as [(chat name, {"peer", "last_at", "count", "read"})],
+        most recent first, from their inbox index.
+        """
+        self._ensure_inbox(user)
+        return inbox.chats(user)
+
+    def _ensure_inbox(self, user):
+        if not inbox.exists(user):
+            self._build_inbox(user)
+
+    def _build_inbox(self, user):
+        """One-shot index of chats created before inboxes existed (counted as read)."""
+        for name in self.list_chats():
+            members = name.split("__")
+            if user not in members:
+                continue
+            chat = self.read_chat(name) or {}
+            log = self.chat_log(name)
+            last = next(log.iter_reverse(), None)
+            created_at = chat.get("created_at", 0)
+            inbox.add_chat(
+                user, name, next((m for m in members if m != user), user), created_at,
+                count=len(log), last_at=last[1].get("timestamp") if last else None,
+            )
+        # Empty inbox for users without chats, so this runs once
+        inbox.touch(user)
 
     def create_chat(self, chat_name, user_a, user_b):
         if user_a == user_b:
@@ -300,106 +692,321 @@ class BeepFS:
 
         members = sorted([user_a, user_b])
         name = "__".join(members)
-        path = self.chat_path(name)
-        if path.exists():
+        if room_store.exists("chats", name):
             return name
 
         chat = {
             "name": name,
             "members": members,
-            "messages": [],
             "created_at": time.time()
         }
-        self._write_json(path, chat)
+        for member in members:
+            self._ensure_inbox(member)
+        room_store.put("chats", name, chat)
+        for member in members:
+            peer = user_b if member == user_a else user_a
+            inbox.add_chat(member, name, peer, chat["created_at"])
         return name
 
     def read_chat(self, name):
-        return self._read_json(self.chat_path(name))
+        chat = room_store.get("chats", name)
+        if chat and "messages" in chat:
+            self._move_messages_to_log(chat, self.chat_log(name))
+            room_store.put("chats", name, chat)
+        return chat
 
     def chat_say(self, chat_name, sender, message):
         chat = self.read_chat(chat_name)
         if not chat or sender not in chat["members"]:
             raise PermissionError("Cannot send message")
 
-        msg_bytes = message.encode()
-        encrypted = {}
-
+        # Index any pre-inbox chats first, so this message counts as unread
         for member in chat["members"]:
-            _, pub_key = load_or_create_keys(member)
-            encrypted_blob = pub_key.encrypt(
-                msg_bytes,
-                padding.OAEP(
-                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None
-                )
-            )
-            encrypted[member] = encrypted_blob.hex()
-
-        chat["messages"].append({
-            "sender": sender,
-            "timestamp": int(time.time()),
-            "encrypted": encrypted
-        })
-
-        self._write_json(self.chat_path(chat_name), chat)
+            self._ensure_inbox(member)
+        seq, timestamp = self._append_message(self.chat_log(chat_name), chat["members"], sender, message)
+        for member in chat["members"]:
+            peer = next((m for m in chat["members"] if m != member), member)
+            inbox.message(member, chat_name, peer, seq, timestamp, own=member == sender)
 
-    def chat_read_messages(self, chat_name, user, start=0, limit=10):
+    def chat_read_messages(self, chat_name, user, limit=10, new=False):
+        """Same as read_messages, for a DM chat (the cursor lives in the inbox)."""
         chat = self.read_chat(chat_name)
         if not chat or user not in chat["members"]:
             return [], 0
 
-        priv_key, _ = load_or_create_keys(user)
-        visible = []
+        self._ensure_inbox(user)
+        log = self.chat_log(chat_name)
+        if new:
+            messages, total = self._read_from(log, user, inbox.read_upto(user, chat_name))
+        else:
+            messages, total = self._read_log(log, user, limit)
+        inbox.mark_read(user, chat_name, total)
+        return messages, total
 
-        for msg in chat["messages"]:
-            if user not in msg["encrypted"]:
-                continue
-            try:
-                decrypted = priv_key.decrypt(
-                    bytes.fromhex(msg["encrypted"][user]),
-                    padding.OAEP(
-                        mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                        algorithm=hashes.SHA256(),
-                        label=None
-                    )
-                )
-                visible.append({
-                    "sender": msg["sender"],
-                    "timestamp": msg["timestamp"],
-                    "content": decrypted.decode()
-                })
-            except:
-                continue
+    # ----------- ENCRYPTION HELPERS -----------
+    # Messages are sealed once with the room/chat content key of the current
+    # epoch; keys/<epoch>.json next to the log holds that key wrapped per
+    # member. Messages written before that carry one RSA blob per member.
 
-        total = len(visible)
-        return visible[start:start + limit], total
+    @staticmethod
+    def _keys_dir(log):
+        return log.dir / "keys"
 
-    # ----------- ENCRYPTION HELPERS -----------
-    def _encrypt_old_messages_for_new_user(self, container, new_user):
-        _, pub_key = load_or_create_keys(new_user)
+    def _key_file(self, log, epoch):
+        return self._keys_dir(log) / f"{epoch:06d}.json"
 
-        for msg in container["messages"]:
-            if new_user in msg["encrypted"]:
-                continue
+    def _epochs(self, log):
+        keys_dir = self._keys_dir(log)
+        if not keys_dir.exists():
+            return []
+        return sorted(int(p.stem) for p in keys_dir.glob("*.json"))
+
+    def _current_epoch(self, log):
+        """Newest key epoch of a log, or None before the first one."""
+        # Epochs are numbered without gaps: the cached one is still the
+        # newest while its file exists and the next one does not
+        epoch = _current_epochs.get(log.dir)
+        if (epoch is not None and self._key_file(log, epoch).exists()
+                and not self._key_file(log, epoch + 1).exists()):
+            return epoch
+        epochs = self._epochs(log)
+        epoch = epochs[-1] if epochs else None
+        _current_epochs[log.dir] = epoch
+        return epoch
+
+    def _wrapped_keys(self, log, epoch):
+        return self._read_json(self._key_file(log, epoch), default={})
+
+    def _keys_lock(self, log):
+        self._keys_dir(log).mkdir(parents=True, exist_ok=True)
+        return file_lock(self._keys_dir(log) / ".lock")
+
+    def _rotate_key(self, log, members):
+        """Create a fresh content key wrapped for members; returns the new epoch."""
+        key = new_content_key()
+        with self._keys_lock(log):
+            epochs = self._epochs(log)
+            epoch = epochs[-1] + 1 if epochs else 0
+            wrapped = {m: wrap_key(m, key) for m in members}
+            self._write_json(self._key_file(log, epoch), wrapped)
+            stamp = self._key_stamp(log, epoch)
+        _current_epochs[log.dir] = epoch
+        for member in members:
+            _content_keys[(log.dir, epoch, member)] = (stamp, key)
+        return epoch
+
+    def _add_member_key(self, log, members, new_user):
+        """
+        Let a new member read what is sent from now on: wrap the current key
+        for them, or start a new epoch if messages were already sent with it.
+        """
+        with self._keys_lock(log):
+            epoch = self._current_epoch(log)
+            if epoch is None:
+                # No hybrid message yet; the first one creates a key for all members
+                return
+            last = next(log.iter_reverse(), None)
+            wrapped = self._wrapped_keys(log, epoch)
+            if wrapped and (last is None or last[1].get("epoch") != epoch):
+                key = self._content_key(log, next(iter(wrapped)), epoch)
+                wrapped[new_user] = wrap_key(new_user, key)
+                self._write_json(self._key_file(log, epoch), wrapped)
+                return
+        self._rotate_key(log, members)
+
+    def _grant_old_keys(self, log, new_user):
+        """Wrap every existing epoch key for a member who may read history."""
+        with self._keys_lock(log):
+            for epoch in self._epochs(log):
+                wrapped = self._wrapped_keys(log, epoch)
+                if new_user in wrapped or not wrapped:
+                    continue
+                key = self._content_key(log, next(iter(wrapped)), epoch)
+                wrapped[new_user] = wrap_key(new_user, key)
+                self._write_json(self._key_file(log, epoch), wrapped)
+
+    def _key_stamp(self, log, epoch):
+        try:
+            st = self._key_file(log, epoch).stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _content_key(self, log, user, epoch):
+        """The content key of an epoch as seen by user, or None without access."""
+        cache_key = (log.dir, epoch, user)
+        stamp = self._key_stamp(log, epoch)
+        cached = _content_keys.get(cache_key)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        wrapped = self._wrapped_keys(log, epoch).get(user) if stamp else None
+        if wrapped is None:
+            _content_keys.pop(cache_key, None)
+            return None
+        key = unwrap_key(user, wrapped)
+        _content_keys[cache_key] = (stamp, key)
+        return key
+
+    @staticmethod
+    def _message_aad(sender, timestamp):
+        return f"{sender}:{timestamp}".encode()
 
+    @staticmethod
+    def _signed_bytes(msg):
+        """What a sender signs: the ciphertext together with its place in the log."""
+        fields = [msg["id"], msg["sender"], msg["timestamp"], msg["epoch"], msg["ciphertext"]]
+        return json.dumps(fields, separators=(",", ":")).encode()
+
+    def _check_signature(self, msg):
+        """Raise unless a message from a signing (EC) identity carries its valid signature."""
+        if not signs(msg["sender"]):
+            return
+        # Signing identities only ever send signed content-key records; a
+        # per-member (pre-content-key) record in their name is forged
+        if "ciphertext" not in msg or "sig" not in msg:
+            raise ValueError(f"Unsigned message from '{msg['sender']}'")
+        verify(msg["sender"], self._signed_bytes(msg), msg["sig"])
+
+    def _append_message(self, log, members, sender, message):
+        epoch = self._current_epoch(log)
+        key = self._content_key(log, sender, epoch) if epoch is not None else None
+        if key is None:
+            # First hybrid message here, or sender missing from the current epoch
+            epoch = self._rotate_key(log, members)
+            key = self._content_key(log, sender, epoch)
+
+        timestamp = int(time.time())
+        record = {
+            "id": uuid.uuid4().hex[:12],
+            "sender": sender,
+            "timestamp": timestamp,
+            "epoch": epoch,
+            "ciphertext": seal(key, message.encode(), self._message_aad(sender, timestamp)),
+        }
+        # EC identities also sign what they send; RSA ones have no signing key
+        signature = sign(sender, self._signed_bytes(record))
+        if signature:
+            record["sig"] = signature
+        return log.append(record), timestamp
+
+    def _decrypt_message(self, log, user, msg):
+        """Plaintext view of a log record for user, or None if not readable."""
+        try:
+            if "ciphertext" in msg:
+                key = self._content_key(log, user, msg["epoch"])
+                if key is None:
+                    return None
+                self._check_signature(msg)
+                aad = self._message_aad(msg["sender"], msg["timestamp"])
+                plaintext = unseal(key, msg["ciphertext"], aad)
+            else:
+                if user not in msg["encrypted"]:
+                    return None
+                self._check_signature(msg)
+                plaintext = decrypt_for(user, bytes.fromhex(msg["encrypted"][user]))
+        except Exception:
+            return None
+        return {
+            "sender": msg["sender"],
+            "timestamp": msg["timestamp"],
+            "content": plaintext.decode(),
+        }
+
+    @staticmethod
+    def _message_id(log, seq, msg):
+        # Records from before message ids are identified by their position
+        return msg.get("id") or (str(log.dir), seq, msg["sender"], msg["timestamp"])
+
+    def _cached_decrypt(self, log, user, seq, msg):
+        cache_key = (user, self._message_id(log, seq, msg))
+        with _plaintexts_lock:
+            if cache_key in _plaintexts:
+                _plaintexts.move_to_end(cache_key)
+                return _plaintexts[cache_key]
+
+        decrypted = self._decrypt_message(log, user, msg)
+        if decrypted:
+            with _plaintexts_lock:
+                _plaintexts[cache_key] = decrypted
+                while len(_plaintexts) > PLAINTEXT_CACHE:
+                    _plaintexts.popitem(last=False)
+        return decrypted
+
+    def _decrypt_all(self, log, user, records, workers=None):
+        """
+        Decrypt (seq, record) pairs in order, skipping unreadable ones.
+        Large batches are spread over a thread pool; cryptography releases
+        the GIL while it works, so RSA-heavy histories scale across cores.
+        """
+        workers = workers or config.DECRYPT_WORKERS
+        if workers <= 1 or len(records) < config.PARALLEL_DECRYPT_MIN:
+            decrypted = [self._cached_decrypt(log, user, seq, msg) for seq, msg in records]
+            return [m for m in decrypted if m]
+
+        # Unwrap each epoch key once up front instead of racing in the workers
+        for epoch in {msg["epoch"] for _, msg in records if "epoch" in msg}:
+            self._content_key(log, user, epoch)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            decrypted = pool.map(lambda r: self._cached_decrypt(log, user, *r), records)
+            return [m for m in decrypted if m]
+
+    def _read_log(self, log, user, limit):
+        """Decrypt lazily from the tail until `limit` visible messages are found."""
+        if limit is None:
+            return self._decrypt_all(log, user, list(log.iter_from(0))), len(log)
+
+        visible = []
+        if limit > 0:
+            for seq, msg in log.iter_reverse():
+                decrypted = self._cached_decrypt(log, user, seq, msg)
+                if decrypted:
+                    visible.append(decrypted)
+                    if len(visible) >= limit:
+                        break
+        visible.reverse()
+        return visible, len(log)
+
+    def _read_from(self, log, user, start):
+        """
+        Decrypt the records from sequence number start on (seeks straight to
+        its segment). Returns (messages, sequence number after the last record).
+        """
+        # A cursor past the end (e.g. from a log since recreated) reads from the end
+        start = min(start, len(log))
+        records = list(log.iter_from(start))
+        end = records[-1][0] + 1 if records else start
+        return self._decrypt_all(log, user, records), end
+
+    def _reencrypt_for(self, new_user):
+        """Per-record converter giving new_user a copy of a pre-hybrid message."""
+        def reencrypt(msg):
             sender = msg["sender"]
-            priv_key, _ = load_or_create_keys(sender)
-            decrypted = priv_key.decrypt(
-                bytes.fromhex(msg["encrypted"][sender]),
-                padding.OAEP(
-                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None
-                )
-            )
+            decrypted = decrypt_for(sender, bytes.fromhex(msg["encrypted"][sender]))
+            return encrypt_for(new_user, decrypted).hex()
 
-            encrypted_blob = pub_key.encrypt(
-                decrypted,
-                padding.OAEP(
-                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None
-                )
-            )
-            msg["encrypted"][new_user] = encrypted_blob.hex()
+        return reencrypt
+
+    # ----------- HISTORY BACKFILL -----------
+    @staticmethod
+    def _job_path(kind, name, user):
+        return JOBS_DIR / f"{kind}__{name}__{user}.json"
+
+    def _start_backfill(self, kind, name, user):
+        log = room_store.log(kind, name)
+        job_path = self._job_path(kind, name, user)
+        Backfill.create(job_path, log, kind, name, user)
+        return Backfill(job_path, log, self._reencrypt_for(user)).start()
+
+    def resume_backfills(self):
+        """Restart backfills left unfinished by an earlier session."""
+        threads = []
+        for job_path in JOBS_DIR.glob("*.json"):
+            try:
+                job = json.loads(job_path.read_text())
+            except ValueError:
+                continue
+            log = room_store.log(job["kind"], job["name"])
+            backfill = Backfill(job_path, log, self._reencrypt_for(job["user"]))
+            threads.append(backfill.start())
+        return threads
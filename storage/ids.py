@@ -0,0 +1,45 @@
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+# Post ids: "post" + 12 hex digits of Unix milliseconds + 2 hex digits of a
+# per-millisecond counter + 4 random hex digits. Fixed width, so plain string
+# order (and therefore a directory listing) is chronological order.
+PREFIX = "post"
+TIME_ORDERED_ID = re.compile(r"^post[0-9a-f]{18}$")
+
+_lock = threading.Lock()
+_last = {"ms": 0, "seq": 0}
+
+
+def new_post_id(when=None):
+    """
+    A fresh time-ordered id. Ids from one process are strictly increasing;
+    the random tail keeps concurrent sessions from colliding.
+    when (a Unix timestamp) backdates the id, e.g. when migrating old posts.
+    """
+    ms = int((time.time() if when is None else when) * 1000)
+    with _lock:
+        if when is None and ms <= _last["ms"]:
+            ms, seq = _last["ms"], _last["seq"] + 1
+            if seq > 0xFF:
+                # Counter exhausted within this millisecond: borrow the next one
+                ms, seq = ms + 1, 0
+        else:
+            seq = 0
+        if when is None:
+            _last["ms"], _last["seq"] = ms, seq
+    return f"{PREFIX}{ms:012x}{seq:02x}{os.urandom(2).hex()}"
+
+
+def is_time_ordered(post_id):
+    return bool(post_id) and TIME_ORDERED_ID.match(post_id) is not None
+
+
+def id_time(post_id):
+    """Creation time encoded in a time-ordered id (None for legacy ids)."""
+    if not is_time_ordered(post_id):
+        return None
+    return datetime.fromtimestamp(int(post_id[len(PREFIX):len(PREFIX) + 12], 16) / 1000)
@@ -0,0 +1,111 @@
+import json
+from pathlib import Path
+
+from storage.locks import file_lock
+from storage.fileio import write_json
+
+
+class _UserIndex:
+    """One small JSON file per user, rewritten atomically under a lock."""
+
+    def __init__(self, directory):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, user):
+        return self.dir / f"{user}.json"
+
+    def _load(self, user):
+        path = self._path(user)
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _update(self, user, change):
+        """Apply change(inbox) to one user's inbox under its lock."""
+        with file_lock(self.dir / f".{user}.lock"):
+            inbox = self._load(user) or {}
+            change(inbox)
+            write_json(self._path(user), inbox, indent=4)
+
+    def exists(self, user):
+        return self._path(user).exists()
+
+
+class ChatInbox(_UserIndex):
+    """
+    Per-user index of DM chats: inbox/<user>.json maps chat name to
+    {"peer", "last_at", "count", "read"}. "count" is the number of
+    messages in the chat log and "read" how many of them the user has
+    seen, so unread counts need no decryption. Updated when chats are
+    created, messages sent and messages read.
+    """
+
+    def touch(self, user):
+        """Create an empty inbox if the user has none."""
+        self._update(user, lambda inbox: None)
+
+    def add_chat(self, user, chat, peer, created_at, count=0, last_at=None):
+        def change(inbox):
+            inbox.setdefault(chat, {
+                "peer": peer,
+                "last_at": last_at or created_at,
+                "count": count,
+                "read": count,
+            })
+        self._update(user, change)
+
+    def message(self, user, chat, peer, seq, timestamp, own=False):
+        """Record message number seq of a chat; the sender has read their own message."""
+        def change(inbox):
+            entry = inbox.setdefault(chat, {"peer": peer, "last_at": timestamp, "count": 0, "read": 0})
+            entry["count"] = max(entry["count"], seq + 1)
+            entry["last_at"] = max(entry["last_at"], timestamp)
+            if own:
+                entry["read"] = max(entry["read"], seq + 1)
+        self._update(user, change)
+
+    def mark_read(self, user, chat, upto):
+        """The user has seen the first `upto` messages of chat."""
+        def change(inbox):
+            entry = inbox.get(chat)
+            if entry is not None:
+                entry["read"] = max(entry["read"], upto)
+                entry["count"] = max(entry["count"], upto)
+        self._update(user, change)
+
+    def read_upto(self, user, chat):
+        """How many messages of chat the user has seen."""
+        entry = (self._load(user) or {}).get(chat)
+        return entry["read"] if entry else 0
+
+    def chats(self, user):
+        """[(chat name, entry)], most recent activity first."""
+        inbox = self._load(user) or {}
+        return sorted(inbox.items(), key=lambda item: item[1]["last_at"], reverse=True)
+
+
+class RoomCursors(_UserIndex):
+    """
+    Per-user read cursors for rooms: <user>.json maps room name to
+    [room created_at, messages of its log the user has seen]. Unread =
+    log length - cursor. A room deleted and created again under the same
+    name has a new created_at, so it starts with a fresh cursor.
+    """
+
+    def get(self, user, room, created_at=None):
+        made, seen = (self._load(user) or {}).get(room, [created_at, 0])
+        return seen if made == created_at else 0
+
+    def all(self, user):
+        """{room: (created_at, seen)}"""
+        return {room: tuple(value) for room, value in (self._load(user) or {}).items()}
+
+    def advance(self, user, room, upto, created_at=None):
+        def change(cursors):
+            made, seen = cursors.get(room, [created_at, 0])
+            if made != created_at:
+                seen = 0
+            cursors[room] = [created_at, max(seen, upto)]
+        self._update(user, change)
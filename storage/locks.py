@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on every platform
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on path (created if missing)."""
+    with open(path, "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
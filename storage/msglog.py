@@ -0,0 +1,150 @@
+import json
+import shutil
+from pathlib import Path
+
+from storage.locks import file_lock
+from storage.fileio import write_atomic
+
+# Records per segment; every segment but the last is always full, so a
+# message's sequence number maps straight to (segment, line)
+SEGMENT_RECORDS = 1000
+
+
+class MessageLog:
+    """
+    Append-only message log for one room or chat.
+
+    Records are JSON lines spread over numbered segment files
+    (00000000.jsonl, 00000001.jsonl, ...). Sending appends one line;
+    readers can start from the newest segment without touching history.
+    """
+
+    def __init__(self, directory):
+        self.dir = Path(directory)
+        self._tail = None   # (segment, size, lines) of the last segment we saw
+
+    # ------------ LAYOUT ------------
+    def _segment_path(self, segment):
+        return self.dir / f"{segment:08d}.jsonl"
+
+    def _segments(self):
+        if not self.dir.exists():
+            return []
+        return sorted(int(p.stem) for p in self.dir.glob("*.jsonl"))
+
+    def _lock(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        return file_lock(self.dir / ".lock")
+
+    def _tail_lines(self, segment):
+        """Line count of the last segment, cached by file size."""
+        path = self._segment_path(segment)
+        size = path.stat().st_size
+        if self._tail and self._tail[:2] == (segment, size):
+            return self._tail[2]
+        with open(path, "rb") as f:
+            lines = sum(1 for _ in f)
+        self._tail = (segment, size, lines)
+        return lines
+
+    @staticmethod
+    def _read_segment(path):
+        records = []
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+        return records
+
+    # ------------ WRITING ------------
+    def _append_locked(self, line):
+        segments = self._segments()
+        segment = segments[-1] if segments else 0
+        lines = self._tail_lines(segment) if segments else 0
+        if lines >= SEGMENT_RECORDS:
+            segment, lines = segment + 1, 0
+
+        path = self._segment_path(segment)
+        with open(path, "a") as f:
+            f.write(line)
+        self._tail = (segment, path.stat().st_size, lines + 1)
+        return segment * SEGMENT_RECORDS + lines
+
+    def append(self, record):
+        """Append one record and return its sequence number."""
+        line = json.dumps(record) + "\n"
+        with self._lock():
+            return self._append_locked(line)
+
+    def append_missing(self, records):
+        """
+        Make records the start of the log, appending only those past its
+        current length. Safe to repeat after a crash, or from two sessions
+        at once: nothing is written twice.
+        """
+        with self._lock():
+            for record in records[len(self):]:
+                self._append_locked(json.dumps(record) + "\n")
+
+    def rewrite(self, transform, segments=None):
+        """
+        Rewrite records in place (positions never change).
+        transform(seq, record) returns the new record, or None to keep it.
+        """
+        with self._lock():
+            for segment in segments if segments is not None else self._segments():
+                path = self._segment_path(segment)
+                if not path.exists():
+                    continue
+                records = self._read_segment(path)
+                changed = False
+                for i, record in enumerate(records):
+                    new = transform(segment * SEGMENT_RECORDS + i, record)
+                    if new is not None:
+                        records[i] = new
+                        changed = True
+                if changed:
+                    write_atomic(path, "".join(json.dumps(r) + "\n" for r in records))
+            self._tail = None
+
+    def delete(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self._tail = None
+
+    # ------------ READING ------------
+    def segments(self):
+        return self._segments()
+
+    def read_segment(self, segment):
+        """(seq, record) pairs of one segment."""
+        path = self._segment_path(segment)
+        if not path.exists():
+            return []
+        base = segment * SEGMENT_RECORDS
+        return [(base + i, r) for i, r in enumerate(self._read_segment(path))]
+
+    def __len__(self):
+        segments = self._segments()
+        if not segments:
+            return 0
+        return segments[-1] * SEGMENT_RECORDS + self._tail_lines(segments[-1])
+
+    def iter_from(self, start=0):
+        """Yield (seq, record) from sequence number start onwards."""
+        first = start // SEGMENT_RECORDS
+        for segment in self._segments():
+            if segment < first:
+                continue
+            for i, record in enumerate(self._read_segment(self._segment_path(segment))):
+                seq = segment * SEGMENT_RECORDS + i
+                if seq >= start:
+                    yield seq, record
+
+    def iter_reverse(self):
+        """Yield (seq, record) newest first; lines are parsed only when reached."""
+        for segment in reversed(self._segments()):
+            with open(self._segment_path(segment), "rb") as f:
+                lines = f.read().splitlines()
+            for i in range(len(lines) - 1, -1, -1):
+                if lines[i].strip():
+                    yield segment * SEGMENT_RECORDS + i, json.loads(lines[i])
@@ -0,0 +1,214 @@
+import json
+import mmap
+import threading
+import time
+from pathlib import Path
+
+from storage.locks import file_lock
+from storage.fileio import JsonlTail
+import config
+
+# Start a new pack once the active one grows past this size
+PACK_BYTES = 64 * 1024 * 1024
+
+# Rewrite the packs once this share of their bytes is superseded records
+COMPACT_GARBAGE = 0.5
+
+# Loose files folded per lock hold, so writers are never blocked for long
+FOLD_BATCH = 500
+
+
+class PackStore:
+    """
+    Post records packed into append-only files and read through mmap.
+
+    Each pack (000000.pack, 000001.pack, ...) holds one compact JSON record
+    per line. index.jsonl maps post ids to (pack, offset, length); later
+    lines override earlier ones, and it is tailed like the post catalog so
+    every session picks up the others' writes. Reading a post is a slice
+    of an already mapped pack. Same interface as FilePostStore and
+    SqlitePostStore.
+    """
+
+    def __init__(self, directory, loose=None):
+        self.dir = Path(directory)
+        # FilePostStore whose files the compactor folds in
+        self.loose = loose
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.dir / "index.jsonl"
+        self._index = {}    # post_id -> (pack, offset, length)
+        self._log = JsonlTail(self.index_path)
+        self._maps = {}     # pack -> mmap of its file
+        self._mutex = threading.Lock()   # the compactor runs on its own thread
+
+    # ------------ LAYOUT ------------
+    def _pack_path(self, pack):
+        return self.dir / f"{pack:06d}.pack"
+
+    def _packs(self):
+        return sorted(int(p.stem) for p in self.dir.glob("*.pack"))
+
+    def _lock(self):
+        return file_lock(self.dir / ".lock")
+
+    # ------------ INDEX ------------
+    def _reset(self):
+        for mm in self._maps.values():
+            mm.close()
+        self._maps = {}
+        self._index = {}
+
+    def _refresh(self):
+        restarted, entries = self._log.poll()
+        if restarted:
+            # Replaced by a compaction → start over
+            self._reset()
+        for post_id, pack, offset, length in entries:
+            self._index[post_id] = (pack, offset, length)
+
+    def _map(self, pack, end):
+        mm = self._maps.get(pack)
+        if mm is None or len(mm) < end:
+            # New pack, or it grew past what we mapped
+            if mm is not None:
+                mm.close()
+            with open(self._pack_path(pack), "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[pack] = mm
+        return mm
+
+    def _load(self, post_id):
+        pack, offset, length = self._index[post_id]
+        return json.loads(self._map(pack, offset + length)[offset:offset + length])
+
+    # ------------ READING ------------
+    def refresh(self):
+        with self._mutex:
+            self._refresh()
+
+    def get(self, post_id, refresh=True):
+        """Stored record of post_id, or None; refresh=False after one refresh()."""
+        with self._mutex:
+            if refresh:
+                self._refresh()
+            if post_id not in self._index:
+                return None
+            return self._load(post_id)
+
+    def get_many(self, post_ids):
+        """{post_id: record} for the packed ones among post_ids."""
+        with self._mutex:
+            self._refresh()
+            return {pid: self._load(pid) for pid in post_ids if pid in self._index}
+
+    def __contains__(self, post_id):
+        with self._mutex:
+            self._refresh()
+            return post_id in self._index
+
+    def items(self):
+        """(post_id, record) of every packed post, in id order."""
+        with self._mutex:
+            self._refresh()
+            return [(pid, self._load(pid)) for pid in sorted(self._index)]
+
+    # ------------ WRITING ------------
+    def _append(self, records, index_path=None, pack=None):
+        """
+        Append (post_id, data) records, starting a new pack whenever the
+        current one is full, then index them. Caller holds the file lock.
+        """
+        if pack is None:
+            packs = self._packs()
+            pack = packs[-1] if packs else 0
+        entries = []
+        f = open(self._pack_path(pack), "ab")
+        try:
+            offset = f.tell()
+            for post_id, data in records:
+                if offset >= PACK_BYTES:
+                    f.close()
+                    pack += 1
+                    f = open(self._pack_path(pack), "ab")
+                    offset = 0
+                blob = json.dumps(data, separators=(",", ":")).encode()
+                f.write(blob + b"\n")
+                entries.append((post_id, pack, offset, len(blob)))
+                offset += len(blob) + 1
+        finally:
+            f.close()
+        # Index lines go in only once their bytes are in the pack
+        with open(index_path or self.index_path, "a") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in entries))
+
+    def put(self, post_id, data):
+        with self._lock():
+            self._append([(post_id, data)])
+
+    def fold(self, paths):
+        """
+        Move loose post files into the packs. A post that is already packed
+        was saved after its loose file was written, so the file is dropped.
+        Returns the number of files folded.
+        """
+        folded = 0
+        paths = list(paths)
+        for start in range(0, len(paths), FOLD_BATCH):
+            batch = paths[start:start + FOLD_BATCH]
+            with self._lock(), self._mutex:
+                self._refresh()
+                records, done = [], []
+                for path in batch:
+                    if path.stem not in self._index:
+                        try:
+                            records.append((path.stem, json.loads(path.read_text())))
+                        except (OSError, ValueError):
+                            continue    # gone, or mid-write: left for the next run
+                    done.append(path)
+                if records:
+                    self._append(records)
+                for path in done:
+                    path.unlink(missing_ok=True)
+            folded += len(records)
+        return folded
+
+    def compact(self):
+        """Rewrite the packs without superseded records once enough piled up."""
+        with self._lock(), self._mutex:
+            self._refresh()
+            old = self._packs()
+            total = sum(self._pack_path(p).stat().st_size for p in old)
+            live = sum(length + 1 for _, _, length in self._index.values())
+            if not total or (total - live) / total < COMPACT_GARBAGE:
+                return False
+
+            records = [(pid, self._load(pid)) for pid in sorted(self._index)]
+            # New packs are numbered after the old ones; the index swap publishes them
+            tmp = self.index_path.with_suffix(".tmp")
+            tmp.unlink(missing_ok=True)
+            self._append(records, index_path=tmp, pack=old[-1] + 1)
+            tmp.replace(self.index_path)
+
+            self._reset()
+            self._log.forget()
+            for pack in old:
+                self._pack_path(pack).unlink(missing_ok=True)
+            return True
+
+    def prepare(self, interval=None):
+        """
+        Fold the loose post files in and compact, now and then every
+        interval seconds, on a daemon thread.
+        """
+        interval = interval or config.PACK_COMPACT_INTERVAL
+
+        def loop():
+            while True:
+                if self.loose is not None:
+                    self.fold(self.loose.files())
+                self.compact()
+                time.sleep(interval)
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
@@ -1,22 +1,202 @@
+import copy
 import json
+import re
 from pathlib import Path
 import hashlib
 import uuid
 
-# Path to local user storage
+from storage.locks import file_lock
+from storage.fileio import write_json
+from storage.sqlite_store import SqliteUserStore, DB_NAME
+import config
+
+# Legacy single-file user storage (migrated into PROFILES_DIR on first use)
 USER_STORAGE_FILE = Path.home() / ".beep_users.json"
 
-# Load all users from storage
-def load_users():
-    if USER_STORAGE_FILE.exists():
-        with open(USER_STORAGE_FILE, "r") as f:
-            return json.load(f)
-    return {}
+# One JSON record per user plus a small username -> id index
+PROFILES_DIR = Path.home() / ".beep_storage" / "profiles"
+DB_FILE = PROFILES_DIR.parent / DB_NAME   # the "sqlite" backend's database
+
+# Allowed new usernames (they become file names)
+USERNAME = re.compile(r"[a-z0-9_]+")
+
+def _file_stamp(path):
+    # Writes replace the file, so a new inode marks a new version even
+    # when mtime/size would not change
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _storable(username):
+    # Older names may be anything, as long as the record stays inside the records dir
+    return bool(username) and not any(c in username for c in "/\\") and not username.startswith(".")
+
+
+class FileUserStore:
+    """
+    Profiles as one JSON record per user (users/<name>.json) plus a
+    username -> id index, rewritten atomically under one lock. Parsed
+    copies are kept per process, each tagged with the file stamp it was
+    read from. Same interface as SqliteUserStore.
+    """
+
+    def __init__(self, directory):
+        self.dir = Path(directory)
+        self.records_dir = self.dir / "users"
+        self.index_file = self.dir / "index.json"
+        self.records_dir.mkdir(parents=True, exist_ok=True)
+        self._index = {"stamp": None, "users": {}}
+        self._records = {}
+
+    def _record_path(self, username):
+        if not _storable(username):
+            raise ValueError(f"Invalid username '{username}'")
+        return self.records_dir / f"{username}.json"
+
+    # Serialize read-modify-write cycles across concurrent sessions
+    def _locked(self):
+        return file_lock(self.dir / ".lock")
+
+    def _load(self, username):
+        try:
+            path = self._record_path(username)
+        except ValueError:
+            return None
+        stamp = _file_stamp(path)
+        cached = self._records.get(username)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        if stamp is None:
+            self._records.pop(username, None)
+            return None
+        with open(path, "r") as f:
+            record = json.load(f)
+        self._records[username] = (stamp, record)
+        return record
+
+    def _load_existing(self, username):
+        user = self._load(username)
+        if user is None:
+            raise ValueError(f"Username '{username}' not found")
+        return user
+
+    def _save(self, username, record):
+        path = self._record_path(username)
+        write_json(path, record, indent=4)
+        self._records[username] = (_file_stamp(path), record)
+
+    # One-shot split of the legacy single users file into per-user records
+    def migrate_legacy(self, legacy_file):
+        if not legacy_file.exists() or self.index_file.exists():
+            return
+        with self._locked():
+            if self.index_file.exists():
+                return
+            with open(legacy_file, "r") as f:
+                users = json.load(f)
+            # Names that cannot be file names are left behind in the .migrated file
+            users = {u: r for u, r in users.items() if _storable(u)}
+            for username, record in users.items():
+                write_json(self._record_path(username), record, indent=4)
+            write_json(self.index_file, {u: r.get("id") for u, r in users.items()}, indent=4)
+            legacy_file.rename(legacy_file.with_name(legacy_file.name + ".migrated"))
+
+    # ------------ READING ------------
+    def usernames(self):
+        """{username: user id} (cached; reparsed only when the index changes)."""
+        stamp = _file_stamp(self.index_file)
+        if stamp != self._index["stamp"]:
+            users = {}
+            if stamp is not None:
+                with open(self.index_file, "r") as f:
+                    users = json.load(f)
+            self._index = {"stamp": stamp, "users": users}
+        return self._index["users"]
+
+    def get(self, username):
+        user = self._load(username)
+        return copy.deepcopy(user) if user is not None else None
+
+    def get_list(self, username, field):
+        # The cached list itself, not a copy
+        user = self._load(username)
+        return user.get(field, []) if user is not None else []
 
-# Save users back to storage
-def save_users(users):
-    with open(USER_STORAGE_FILE, "w") as f:
-        json.dump(users, f, indent=4)
+    def records(self):
+        """(username, record) of every user, for importing into another store."""
+        for username in self.usernames():
+            record = self._load(username)
+            if record is not None:
+                yield username, record
+
+    # ------------ WRITING ------------
+    def create(self, record):
+        """Save a new user record; ValueError if the name is taken."""
+        username = record["username"]
+        with self._locked():
+            if username in self.usernames():
+                raise ValueError(f"Username '{username}' already exists")
+            self._save(username, copy.deepcopy(record))
+            index = dict(self.usernames())
+            index[username] = record["id"]
+            write_json(self.index_file, index, indent=4)
+
+    def update(self, username, fields):
+        with self._locked():
+            user = self._load_existing(username)
+            user.update(copy.deepcopy(fields))
+            self._save(username, user)
+
+    def append(self, username, field, value):
+        with self._locked():
+            user = self._load_existing(username)
+            user.setdefault(field, []).append(value)
+            self._save(username, user)
+
+    @staticmethod
+    def _toggle(record, field, name, on):
+        """Add (on) or remove name in one of a record's lists; True if it changed."""
+        names = record.setdefault(field, [])
+        if on == (name in names):
+            return False
+        if on:
+            names.append(name)
+        else:
+            names.remove(name)
+        return True
+
+    def follow(self, follower, followee, on=True):
+        """Add (or with on=False remove) one follow, touching only the two records involved."""
+        with self._locked():
+            ua = self._load(follower)
+            ub = self._load(followee)
+            if not ua or not ub:
+                raise ValueError("One of the users does not exist")
+            if self._toggle(ua, "following", followee, on):
+                self._save(follower, ua)
+            if self._toggle(ub, "followers", follower, on):
+                self._save(followee, ub)
+
+    def prepare(self):
+        """Nothing to set up: the files are the store."""
+        return 0
+
+
+# The JSON records always exist: they are the "files" backend's store and
+# what the "sqlite" backend imports on its first start
+_files = FileUserStore(PROFILES_DIR)
+_store = SqliteUserStore(DB_FILE, _files) if config.STORAGE_BACKEND == "sqlite" else _files
+
+# One-shot split of ~/.beep_users.json into per-user records
+def migrate_legacy_users():
+    _files.migrate_legacy(USER_STORAGE_FILE)
+
+
+# Username -> user id for every user
+def user_index():
+    return _store.usernames()
 
 # Hash a password (SHA256 for now)
 def hash_password(password):
@@ -24,11 +204,9 @@ def hash_password(password):
 
 # Create a new user
 def create_user(username, password):
-    users = load_users()
-    if username in users:
-        raise ValueError(f"Username '{username}' already exists")
-
-    users[username] = {
+    if not USERNAME.fullmatch(username or ""):
+        raise ValueError("Username may only contain lowercase letters, digits and _")
+    record = {
         "id": str(uuid.uuid4()),       # unique user ID
         "username": username,
         "password": hash_password(password),
@@ -37,52 +215,43 @@ def create_user(username, password):
         "posts": [],
         "shared": []
     }
-    save_users(users)
-    return users[username]
+    _store.create(record)
+    return record
 
 # Authenticate user
 def authenticate(username, password):
-    users = load_users()
-    if username not in users:
+    user = _store.get(username)
+    if user is None:
         raise ValueError(f"Username '{username}' not found")
-    if users[username]["password"] != hash_password(password):
+    if user["password"] != hash_password(password):
         raise ValueError("Incorrect password")
-    return users[username]
+    return user
 
-# Get user by username
+# Get user by username (a copy; write changes back with update_user)
 def get_user(username):
-    users = load_users()
-    return users.get(username)
+    return _store.get(username)
+
+# One of a user's lists, read-only: from the file store this is the cached
+# list itself, not a copy, so hot paths pay nothing per post id (never modify it)
+def user_list(username, field):
+    return _store.get_list(username, field)
 
 # Update user data (posts, shared, followers)
 def update_user(username, data):
-    users = load_users()
-    if username not in users:
-        raise ValueError(f"Username '{username}' not found")
-    users[username].update(data)
-    save_users(users)
-    return users[username]
+    _store.update(username, data)
+    return _store.get(username)
+
+# Append to one of a user's lists without clobbering concurrent updates
+def append_to_user(username, field, value):
+    _store.append(username, field, value)
 
 # Follow another user
 def follow(user_a, user_b):
-    ua = get_user(user_a)
-    ub = get_user(user_b)
-    if not ua or not ub:
-        raise ValueError("One of the users does not exist")
-    if user_b not in ua["following"]:
-        ua["following"].append(user_b)
-    if user_a not in ub["followers"]:
-        ub["followers"].append(user_a)
-    update_user(user_a, ua)
-    update_user(user_b, ub)
+    _store.follow(user_a, user_b)
 
 # Unfollow another user
 def unfollow(user_a, user_b):
-    ua = get_user(user_a)
-    ub = get_user(user_b)
-    if user_b in ua.get("following", []):
-        ua["following"].remove(user_b)
-    if user_a in ub.get("followers", []):
-        ub["followers"].remove(user_a)
-    update_user(user_a, ua)
-    update_user(user_b, ub)
+    _store.follow(user_a, user_b, on=False)
+
+migrate_legacy_users()
+_store.prepare()
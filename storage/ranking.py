@@ -0,0 +1,38 @@
+import math
+from datetime import datetime
+
+# Engagement weights per (comments, shares, quotes) received
+ENGAGEMENT_WEIGHTS = (1.0, 1.5, 2.0)
+
+# A post's score halves every RECENCY_HALF_LIFE hours
+RECENCY_HALF_LIFE = 12.0
+
+# Multipliers for posts by people you follow, and your own posts
+FOLLOWED_BOOST = 2.0
+OWN_BOOST = 0.5
+
+
+def score_posts(entries, engagement, followed=(), me=None, now=None):
+    """
+    Score candidate catalog entries in one pass: recency decay times
+    (1 + log-damped engagement) times author affinity.
+    engagement maps post_id -> (comments, shares, quotes).
+    Returns [(score, entry)], best first.
+    """
+    now = now or datetime.now()
+    followed = set(followed)
+    scored = []
+    for entry in entries:
+        try:
+            age = (now - datetime.fromisoformat(entry["timestamp"])).total_seconds() / 3600
+        except (TypeError, ValueError):
+            continue
+        counts = engagement.get(entry["post_id"], (0, 0, 0))
+        boost = 1.0 + sum(w * math.log1p(c) for w, c in zip(ENGAGEMENT_WEIGHTS, counts))
+        if entry["creator"] == me:
+            boost *= OWN_BOOST
+        elif entry["creator"] in followed:
+            boost *= FOLLOWED_BOOST
+        scored.append((boost * 0.5 ** (max(age, 0.0) / RECENCY_HALF_LIFE), entry))
+    scored.sort(key=lambda item: (item[0], item[1]["timestamp"], item[1]["post_id"]), reverse=True)
+    return scored
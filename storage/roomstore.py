@@ -0,0 +1,59 @@
+import json
+from pathlib import Path
+
+from storage.msglog import MessageLog
+from storage.fileio import write_json
+
+# Kinds of records: group rooms and DM chats
+KINDS = ("rooms", "chats")
+
+
+class FileRoomStore:
+    """
+    Rooms and chats as one JSON file each (rooms/<name>.json,
+    chats/<name>.json), their messages in segmented logs under
+    logs/<kind>/<name>. Same interface as SqliteRoomStore.
+    """
+
+    def __init__(self, directory):
+        self.dir = Path(directory)
+        for kind in KINDS:
+            (self.dir / kind).mkdir(parents=True, exist_ok=True)
+        self._logs = {}
+
+    def path(self, kind, name):
+        return self.dir / kind / f"{name}.json"
+
+    # ------------ RECORDS ------------
+    def names(self, kind):
+        return sorted(p.stem for p in (self.dir / kind).glob("*.json"))
+
+    def exists(self, kind, name):
+        return self.path(kind, name).exists()
+
+    def get(self, kind, name):
+        try:
+            return json.loads(self.path(kind, name).read_text())
+        except FileNotFoundError:
+            return None
+
+    def put(self, kind, name, record):
+        # Atomic, so concurrent readers never see a half-written file
+        write_json(self.path(kind, name), record, indent=4)
+
+    def delete(self, kind, name):
+        """Drop a record and its message log."""
+        self.path(kind, name).unlink(missing_ok=True)
+        self.log(kind, name).delete()
+
+    # ------------ MESSAGES ------------
+    def log(self, kind, name):
+        # Message logs keep their tail position cached, so reuse one per room/chat
+        key = (kind, name)
+        if key not in self._logs:
+            self._logs[key] = MessageLog(self.dir / "logs" / kind / name)
+        return self._logs[key]
+
+    def prepare(self):
+        """Nothing to set up: the files are the store."""
+        return None
@@ -0,0 +1,229 @@
+import json
+import math
+import re
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+
+from storage.locks import file_lock
+from storage.fileio import JsonlTail, write_atomic
+
+# Rewrite the log once it holds this many superseded lines
+COMPACT_SLACK = 5000
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN.findall((text or "").lower())
+
+
+class SearchIndex:
+    """
+    Inverted index over post text: term -> {post_id: term frequency}.
+
+    Persisted as an append-only JSON-lines log of per-post term counts
+    (and removals), tailed incrementally like the post catalog, so adding
+    a post writes one short line. Queries are ranked with BM25; a term
+    ending in "*" matches every indexed term with that prefix.
+    """
+
+    def __init__(self, path, stored_posts):
+        self.path = Path(path)
+        # stored_posts() yields (post_id, data) for every stored post
+        self.stored_posts = stored_posts
+        self._postings = {}     # term -> {post_id: tf}
+        self._docs = {}         # post_id -> (number of tokens, terms)
+        self._total_len = 0
+        self._terms = []        # sorted vocabulary, for prefix lookups
+        self._terms_dirty = False
+        self._log = JsonlTail(self.path)
+        self._lines = 0
+
+    # ------------ LOADING ------------
+    def _reset(self):
+        self._postings = {}
+        self._docs = {}
+        self._total_len = 0
+        self._terms = []
+        self._terms_dirty = False
+        self._lines = 0
+
+    def _lock(self):
+        # Held to append, and while a compaction or rebuild swaps the file
+        return file_lock(self.path.with_name(self.path.name + ".lock"))
+
+    def _refresh(self):
+        if not self.path.exists():
+            with self._lock():
+                if not self.path.exists():
+                    self._rebuild()
+
+        self._tail()
+        if self._lines - len(self._docs) > COMPACT_SLACK:
+            self.compact()
+
+    def _tail(self):
+        """Apply the lines appended since the last look."""
+        restarted, docs = self._log.poll()
+        if restarted:
+            self._reset()
+        for doc in docs:
+            self._apply(doc)
+            self._lines += 1
+
+    def _drop(self, post_id):
+        length, terms = self._docs.pop(post_id, (0, ()))
+        self._total_len -= length
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(post_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._terms_dirty = True
+
+    def _apply(self, doc):
+        post_id = doc["id"]
+        self._drop(post_id)
+        terms = doc.get("tf")
+        if not terms:
+            return
+        for term, tf in terms.items():
+            if term not in self._postings:
+                self._postings[term] = {}
+                self._terms_dirty = True
+            self._postings[term][post_id] = tf
+        length = sum(terms.values())
+        self._docs[post_id] = (length, tuple(terms))
+        self._total_len += length
+
+    @staticmethod
+    def _doc(post_id, data):
+        """Index line for a post: its term counts, or none if it is not searchable."""
+        if data.get("revoked") or data.get("type") == "share":
+            # Shares repeat the original's text; the original is indexed
+            return {"id": post_id}
+        return {"id": post_id, "tf": dict(Counter(tokenize(data.get("content"))))}
+
+    def _write(self, docs):
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(d, separators=(",", ":")) + "\n" for d in docs))
+
+    def _replace(self, docs):
+        write_atomic(self.path, "".join(json.dumps(d, separators=(",", ":")) + "\n" for d in docs))
+
+    def _rebuild(self):
+        docs = {}
+        for post_id, data in self.stored_posts():
+            docs[post_id] = self._doc(post_id, data)
+        self._replace(d for d in docs.values() if d.get("tf"))
+
+    def rebuild(self):
+        """Recreate the index from the stored posts (first run / lost or stale index)."""
+        with self._lock():
+            self._rebuild()
+
+    def compact(self):
+        """Rewrite the log keeping one line per indexed post."""
+        with self._lock():
+            # No one can append now: take in every line written so far first
+            self._tail()
+            docs = {}
+            for term, postings in self._postings.items():
+                for post_id, tf in postings.items():
+                    docs.setdefault(post_id, {"id": post_id, "tf": {}})["tf"][term] = tf
+            self._replace(docs.values())
+        self._reset()
+        self._log.forget()
+        self._tail()
+
+    # ------------ WRITING ------------
+    def add(self, post_id, data):
+        """Index a saved post (a revoked one is dropped from the index)."""
+        self._refresh()
+        doc = self._doc(post_id, data)
+        with self._lock():
+            self._tail()
+            if doc.get("tf") or post_id in self._docs:
+                self._write([doc])
+                self._apply(doc)
+
+    # ------------ QUERIES ------------
+    def _expand(self, term):
+        """Indexed terms matched by one query term ("foo*" is a prefix)."""
+        if not term.endswith("*"):
+            return [term] if term in self._postings else []
+        prefix = term[:-1].lower()
+        if not prefix:
+            return []
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        i = bisect_left(self._terms, prefix)
+        matches = []
+        while i < len(self._terms) and self._terms[i].startswith(prefix):
+            matches.append(self._terms[i])
+            i += 1
+        return matches
+
+    def _query_terms(self, query):
+        """Index terms for each query term: "foo-bar" is foo and bar, "foo*" a prefix."""
+        groups = []
+        for word in query.lower().split():
+            prefix = word.endswith("*")
+            parts = tokenize(word)
+            for i, part in enumerate(parts):
+                last = i == len(parts) - 1
+                groups.append(self._expand(part + "*" if prefix and last else part))
+        return groups
+
+    def _score(self, matches, n, avg_len, candidates=None):
+        """BM25 of one query term for each post, limited to candidates if given."""
+        scores = {}
+        for match in matches:
+            postings = self._postings[match]
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            if candidates is None or len(postings) <= len(candidates):
+                hits = postings.items()
+            else:
+                hits = ((pid, postings[pid]) for pid in candidates if pid in postings)
+            for post_id, tf in hits:
+                if candidates is not None and post_id not in candidates:
+                    continue
+                length = self._docs[post_id][0]
+                score = idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_len))
+                scores[post_id] = max(scores.get(post_id, 0.0), score)
+        return scores
+
+    def search(self, query, limit=10):
+        """
+        Best matching post ids for query, as [(post_id, score)], best first.
+        Every query term has to match (AND); prefix terms match any expansion.
+        """
+        self._refresh()
+        groups = self._query_terms(query)
+        if not groups or not self._docs or not all(groups):
+            return []
+
+        n = len(self._docs)
+        avg_len = self._total_len / n
+        # Rarest term first: later terms only score posts still in the running
+        groups.sort(key=lambda matches: sum(len(self._postings[m]) for m in matches))
+        scores = None
+        for matches in groups:
+            term_scores = self._score(matches, n, avg_len, scores)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {pid: s + term_scores[pid] for pid, s in scores.items() if pid in term_scores}
+            if not scores:
+                return []
+
+        # Ties go to the newer post (ids are time-ordered)
+        ranked = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return ranked[:limit]
@@ -0,0 +1,143 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from storage.ids import PREFIX, is_time_ordered
+from storage.fileio import write_json
+import config
+
+# Posts are stored as posts/YYYY/MM/DD/<id>.json, the date (UTC) taken from
+# the time-ordered id. Files from before sharding sit flat in posts/ until
+# the migrator moves them.
+
+
+def shard_parts(post_id):
+    """(year, month, day) directory names for a post id, or None (flat)."""
+    if not is_time_ordered(post_id):
+        return None
+    ms = int(post_id[len(PREFIX):len(PREFIX) + 12], 16)
+    day = datetime.fromtimestamp(ms / 1000, timezone.utc)
+    return (f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}")
+
+
+def shard_path(posts_dir, post_id):
+    parts = shard_parts(post_id)
+    return posts_dir.joinpath(*parts, f"{post_id}.json") if parts else posts_dir / f"{post_id}.json"
+
+
+def locate(posts_dir, post_id):
+    """Existing file of a post (sharded, else flat), or None."""
+    sharded = shard_path(posts_dir, post_id)
+    flat = posts_dir / f"{post_id}.json"
+    if sharded.exists():
+        return sharded
+    if flat.exists():
+        return flat
+    # The migrator may have moved it between the two checks
+    return sharded if sharded.exists() else None
+
+
+def _subdirs(path):
+    return sorted(e.name for e in os.scandir(path) if e.is_dir())
+
+
+def iter_post_files(posts_dir):
+    """Every post file, oldest first, one shard directory at a time."""
+    yield from sorted(posts_dir.glob("*.json"))
+    for year in _subdirs(posts_dir):
+        for month in _subdirs(posts_dir / year):
+            for day in _subdirs(posts_dir / year / month):
+                yield from sorted((posts_dir / year / month / day).glob("*.json"))
+
+
+def move_to_shard(posts_dir, path):
+    """Move one flat post file into its shard; never clobbers a newer shard copy."""
+    target = shard_path(posts_dir, path.stem)
+    if target == path:
+        return False
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(path, target)
+    except FileExistsError:
+        pass    # saved into the shard meanwhile; that copy is newer
+    except OSError:
+        # No hard links on this filesystem (e.g. shared storage on Android)
+        if not target.exists():
+            os.replace(path, target)
+            return True
+    path.unlink(missing_ok=True)
+    return True
+
+
+class FilePostStore:
+    """
+    Posts as one JSON file each, sharded by day: the post store of the
+    "files" backend, and where the others find posts saved before their
+    packs or database existed. Same interface as PackStore and
+    SqlitePostStore.
+    """
+
+    def __init__(self, directory):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, post_id):
+        """Where a post is written (its day shard)."""
+        return shard_path(self.dir, post_id)
+
+    def files(self):
+        return iter_post_files(self.dir)
+
+    def _read(self, post_id):
+        path = locate(self.dir, post_id)
+        if path is None:
+            return None
+        try:
+            return json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+
+    def get_many(self, post_ids, workers=None):
+        """
+        {post_id: data} for the stored ones among post_ids; enough of them
+        are read on a small thread pool.
+        """
+        post_ids = list(post_ids)
+        workers = workers or config.READ_WORKERS
+        if workers > 1 and len(post_ids) >= config.PARALLEL_READ_MIN:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                found = dict(zip(post_ids, pool.map(self._read, post_ids)))
+        else:
+            found = {pid: self._read(pid) for pid in post_ids}
+        return {pid: data for pid, data in found.items() if data is not None}
+
+    def put(self, post_id, data):
+        path = self.path(post_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(path, data, indent=4)
+
+    def items(self):
+        """(post_id, data) of every post file, oldest first."""
+        for path in self.files():
+            try:
+                yield path.stem, json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+
+    def migrate_to_shards(self):
+        """Move flat post files into their day shards; safe while the app runs."""
+        moved = 0
+        for path in list(self.dir.glob("*.json")):
+            moved += move_to_shard(self.dir, path)
+        return moved
+
+    def prepare(self):
+        """Run migrate_to_shards in a daemon thread if any flat files are left."""
+        if next(self.dir.glob("*.json"), None) is None:
+            return None
+        thread = threading.Thread(target=self.migrate_to_shards, daemon=True)
+        thread.start()
+        return thread
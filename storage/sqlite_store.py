@@ -0,0 +1,604 @@
+import json
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from storage.catalog import CATALOG_FIELDS, ENGAGEMENT_TYPES, PostCatalog
+from storage.msglog import SEGMENT_RECORDS
+from storage.roomstore import KINDS
+
+# Database of the "sqlite" backend, in the storage directory
+DB_NAME = "beep.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    post_id     TEXT PRIMARY KEY,
+    creator     TEXT,
+    type        TEXT NOT NULL DEFAULT 'post',
+    parent_id   TEXT,
+    shared_from TEXT,
+    revoked     INTEGER NOT NULL DEFAULT 0,
+    timestamp   TEXT NOT NULL DEFAULT '',
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_by_time ON posts (timestamp, post_id);
+CREATE INDEX IF NOT EXISTS posts_by_creator ON posts (creator, timestamp, post_id);
+CREATE INDEX IF NOT EXISTS posts_by_parent ON posts (parent_id, timestamp, post_id);
+CREATE INDEX IF NOT EXISTS posts_by_source ON posts (shared_from, timestamp, post_id);
+"""
+
+USER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username    TEXT PRIMARY KEY,
+    id          TEXT NOT NULL,
+    password    TEXT NOT NULL,
+    data        TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS follows (
+    follower    TEXT NOT NULL,
+    followee    TEXT NOT NULL,
+    PRIMARY KEY (follower, followee)
+);
+CREATE INDEX IF NOT EXISTS follows_by_followee ON follows (followee, follower);
+CREATE TABLE IF NOT EXISTS user_posts (
+    username    TEXT NOT NULL,
+    field       TEXT NOT NULL,
+    post_id     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS user_posts_by_user ON user_posts (username, field);
+"""
+
+ROOM_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    kind        TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    data        TEXT NOT NULL,
+    PRIMARY KEY (kind, name)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    kind        TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    seq         INTEGER NOT NULL,
+    data        TEXT NOT NULL,
+    PRIMARY KEY (kind, name, seq)
+);
+"""
+
+COLUMNS = ("post_id",) + CATALOG_FIELDS
+
+# Profile lists kept in user_posts, in append order
+POST_LISTS = ("posts", "shared", "comments")
+
+
+class _SqliteStore:
+    """One WAL-mode connection per process, shared by the session's threads."""
+
+    def __init__(self, path, schema):
+        self.path = Path(path)
+        self._db = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._mutex = threading.RLock()
+        with self._mutex:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(schema)
+
+    def _query(self, sql, args=()):
+        with self._mutex:
+            return self._db.execute(sql, args).fetchall()
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction; concurrent sessions wait on each other through the busy timeout."""
+        with self._mutex:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+
+class SqlitePostStore(_SqliteStore):
+    """
+    Posts of the "sqlite" backend. Same interface as FilePostStore and
+    PackStore for the records, and answers the same queries as
+    PostCatalog (feed order, comments, shares/quotes, followed feed)
+    straight from indexes, so no catalog file is kept. Every save is its
+    own transaction.
+    """
+
+    sort_key = staticmethod(PostCatalog.sort_key)
+
+    def __init__(self, path, loose_posts):
+        super().__init__(path, SCHEMA)
+        # loose_posts() yields (post_id, data) of post files to import
+        self.loose_posts = loose_posts
+
+    @staticmethod
+    def _row(post_id, data):
+        entry = PostCatalog.make_entry(post_id, data)
+        entry["revoked"] = int(entry["revoked"])
+        entry["timestamp"] = entry["timestamp"] or ""
+        return tuple(entry[c] for c in COLUMNS) + (json.dumps(data),)
+
+    @staticmethod
+    def _entry(row):
+        entry = {c: row[c] for c in COLUMNS}
+        entry["revoked"] = bool(entry["revoked"])
+        return entry
+
+    # ------------ POST RECORDS ------------
+    def put(self, post_id, data):
+        self.put_many([(post_id, data)])
+
+    def put_many(self, records):
+        """Insert or replace (post_id, data) records in one transaction."""
+        rows = [self._row(pid, data) for pid, data in records]
+        with self._transaction() as db:
+            db.executemany(
+                f"INSERT OR REPLACE INTO posts ({', '.join(COLUMNS)}, data) "
+                f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+                rows,
+            )
+        return len(rows)
+
+    def get_data(self, post_id):
+        rows = self._query("SELECT data FROM posts WHERE post_id = ?", (post_id,))
+        return json.loads(rows[0]["data"]) if rows else None
+
+    def get_many(self, post_ids):
+        """{post_id: data} for the stored ones among post_ids."""
+        found = {}
+        post_ids = list(post_ids)
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(post_ids), 500):
+            chunk = post_ids[start:start + 500]
+            rows = self._query(
+                f"SELECT post_id, data FROM posts WHERE post_id IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            found.update((row["post_id"], json.loads(row["data"])) for row in rows)
+        return found
+
+    def items(self):
+        for row in self._query("SELECT post_id, data FROM posts ORDER BY post_id"):
+            yield row["post_id"], json.loads(row["data"])
+
+    def is_empty(self):
+        return not self._query("SELECT 1 FROM posts LIMIT 1")
+
+    def rebuild(self):
+        """Import the loose post files (after a migration, or on first use)."""
+        return self.put_many(self.loose_posts())
+
+    def prepare(self):
+        """First start: import the post files."""
+        return self.rebuild() if self.is_empty() else 0
+
+    # ------------ CATALOG QUERIES ------------
+    def refresh(self):
+        """Nothing to do: every query reads the committed state."""
+
+    def record(self, post_id, data):
+        """Nothing to do: put() wrote the metadata with the post."""
+
+    def get(self, post_id, refresh=True):
+        rows = self._query(f"SELECT {', '.join(COLUMNS)} FROM posts WHERE post_id = ?", (post_id,))
+        return self._entry(rows[0]) if rows else None
+
+    def entries(self):
+        return list(self.iter_older())
+
+    def iter_older(self, before=None, newest=None, batch=100):
+        """Entries newest first, older than `before`, no newer than `newest`."""
+        return self._iter_newest_first([], [], before, newest, batch)
+
+    def iter_followed(self, username, before=None, newest=None, batch=100):
+        """
+        Like iter_older, for the posts of everyone username follows (the
+        follows table of SqliteUserStore, kept in the same database), in
+        one indexed query.
+        """
+        where = ["creator IN (SELECT followee FROM follows WHERE follower = ?)"]
+        return self._iter_newest_first(where, [username], before, newest, batch)
+
+    def _iter_newest_first(self, where, args, before, newest, batch):
+        where, args = list(where), list(args)
+        if newest is not None:
+            where.append("timestamp <= ?")
+            args.append(newest)
+        key = tuple(before) if before else None
+        while True:
+            clauses = where + (["(timestamp, post_id) < (?, ?)"] if key else [])
+            rows = self._query(
+                f"SELECT {', '.join(COLUMNS)} FROM posts"
+                f"{' WHERE ' + ' AND '.join(clauses) if clauses else ''}"
+                " ORDER BY timestamp DESC, post_id DESC LIMIT ?",
+                args + (list(key) if key else []) + [batch],
+            )
+            for row in rows:
+                yield self._entry(row)
+            if len(rows) < batch:
+                return
+            key = (rows[-1]["timestamp"], rows[-1]["post_id"])
+
+    def _page(self, column, post_id, limit, cursor, extra=""):
+        args = [post_id]
+        after = ""
+        if cursor:
+            after = " AND (timestamp, post_id) > (SELECT timestamp, post_id FROM posts WHERE post_id = ?)"
+            args.append(cursor)
+        rows = self._query(
+            f"SELECT post_id FROM posts WHERE {column} = ?{extra}{after}"
+            " ORDER BY timestamp, post_id LIMIT ?",
+            args + [limit + 1],
+        )
+        page = [row["post_id"] for row in rows[:limit]]
+        return page, (page[-1] if len(rows) > limit and page else None)
+
+    def count_comments(self, post_id):
+        return self._query(
+            "SELECT COUNT(*) FROM posts WHERE parent_id = ? AND type = 'comment'", (post_id,)
+        )[0][0]
+
+    def comments(self, post_id, limit, cursor=None):
+        return self._page("parent_id", post_id, limit, cursor, extra=" AND type = 'comment'")
+
+    def engagement(self, post_ids):
+        """{post_id: (comments, shares, quotes)}, from the parent/source indexes."""
+        counts = {pid: [0, 0, 0] for pid in post_ids}
+        post_ids = list(counts)
+        for start in range(0, len(post_ids), 400):
+            chunk = post_ids[start:start + 400]
+            marks = ", ".join("?" * len(chunk))
+            rows = self._query(
+                f"SELECT parent_id AS target, type, COUNT(*) AS n FROM posts"
+                f" WHERE parent_id IN ({marks}) AND type = 'comment' GROUP BY parent_id"
+                f" UNION ALL SELECT shared_from, type, COUNT(*) FROM posts"
+                f" WHERE shared_from IN ({marks}) GROUP BY shared_from, type",
+                chunk + chunk,
+            )
+            for row in rows:
+                if row["type"] in ENGAGEMENT_TYPES:
+                    counts[row["target"]][ENGAGEMENT_TYPES.index(row["type"])] += row["n"]
+        return {pid: tuple(c) for pid, c in counts.items()}
+
+    def count_derivatives(self, post_id):
+        return self._query("SELECT COUNT(*) FROM posts WHERE shared_from = ?", (post_id,))[0][0]
+
+    def derivatives(self, post_id, limit, cursor=None):
+        return self._page("shared_from", post_id, limit, cursor)
+
+
+class SqliteUserStore(_SqliteStore):
+    """
+    Profiles in the same SQLite database as SqlitePostStore. Follows are
+    one indexed (follower, followee) table and the posts/shared/comments
+    lists one row per post, so following someone or posting writes a row
+    instead of rewriting a whole profile, each in its own transaction.
+    get() assembles the same record dict the JSON profile files hold; same
+    interface as FileUserStore.
+    """
+
+    def __init__(self, path, source=None):
+        super().__init__(path, USER_SCHEMA)
+        # FileUserStore imported on first start
+        self.source = source
+        self._writes = 0
+        self._usernames = (None, {})
+
+    # ------------ READING ------------
+    def usernames(self):
+        """{username: user id}, reloaded only after a commit (here or elsewhere)."""
+        version = (self._query("PRAGMA data_version")[0][0], self._writes)
+        if version != self._usernames[0]:
+            users = {row["username"]: row["id"] for row in self._query("SELECT username, id FROM users")}
+            self._usernames = (version, users)
+        return self._usernames[1]
+
+    def exists(self, username):
+        return bool(self._query("SELECT 1 FROM users WHERE username = ?", (username,)))
+
+    def get(self, username):
+        rows = self._query("SELECT * FROM users WHERE username = ?", (username,))
+        if not rows:
+            return None
+        user = {"id": rows[0]["id"], "username": username, "password": rows[0]["password"]}
+        for field in ("followers", "following") + POST_LISTS:
+            user[field] = self.get_list(username, field)
+        user.update(json.loads(rows[0]["data"]))
+        return user
+
+    def get_list(self, username, field):
+        if field == "following":
+            rows = self._query("SELECT followee FROM follows WHERE follower = ? ORDER BY rowid", (username,))
+        elif field == "followers":
+            rows = self._query("SELECT follower FROM follows WHERE followee = ? ORDER BY rowid", (username,))
+        elif field in POST_LISTS:
+            rows = self._query(
+                "SELECT post_id FROM user_posts WHERE username = ? AND field = ? ORDER BY rowid",
+                (username, field),
+            )
+        else:
+            rows = self._query("SELECT data FROM users WHERE username = ?", (username,))
+            return json.loads(rows[0]["data"]).get(field, []) if rows else []
+        return [row[0] for row in rows]
+
+    def is_empty(self):
+        return not self._query("SELECT 1 FROM users LIMIT 1")
+
+    # ------------ WRITING ------------
+    @contextmanager
+    def _transaction(self):
+        with super()._transaction() as db:
+            yield db
+            self._writes += 1
+
+    @staticmethod
+    def _set_fields(db, username, fields):
+        """Write record fields inside a transaction; lists are replaced whole."""
+        extra = {}
+        for field, value in fields.items():
+            if field == "following":
+                db.execute("DELETE FROM follows WHERE follower = ?", (username,))
+                db.executemany("INSERT OR IGNORE INTO follows VALUES (?, ?)", [(username, u) for u in value])
+            elif field == "followers":
+                db.execute("DELETE FROM follows WHERE followee = ?", (username,))
+                db.executemany("INSERT OR IGNORE INTO follows VALUES (?, ?)", [(u, username) for u in value])
+            elif field in POST_LISTS:
+                db.execute("DELETE FROM user_posts WHERE username = ? AND field = ?", (username, field))
+                db.executemany(
+                    "INSERT INTO user_posts VALUES (?, ?, ?)", [(username, field, pid) for pid in value]
+                )
+            elif field in ("id", "password"):
+                db.execute(f"UPDATE users SET {field} = ? WHERE username = ?", (value, username))
+            elif field != "username":
+                extra[field] = value
+        if extra:
+            row = db.execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+            data = dict(json.loads(row["data"]), **extra)
+            db.execute("UPDATE users SET data = ? WHERE username = ?", (json.dumps(data), username))
+
+    def create(self, record):
+        """Insert a new user record; ValueError if the name is taken."""
+        username = record["username"]
+        with self._transaction() as db:
+            if db.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone():
+                raise ValueError(f"Username '{username}' already exists")
+            db.execute("INSERT INTO users (username, id, password) VALUES (?, ?, ?)",
+                       (username, record.get("id") or "", record.get("password") or ""))
+            self._set_fields(db, username, record)
+
+    def import_records(self, records):
+        """
+        First start: copy records (username -> record) into an empty store.
+        Runs once even when sessions start together.
+        """
+        with self._transaction() as db:
+            if db.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+                return 0
+            for username, record in records.items():
+                db.execute("INSERT INTO users (username, id, password) VALUES (?, ?, ?)",
+                           (username, record.get("id") or "", record.get("password") or ""))
+            for username, record in records.items():
+                # Both sides of a follow are listed in the files; one row is kept
+                self._set_fields(db, username, {
+                    f: v for f, v in record.items() if f not in ("followers", "id", "password")
+                })
+        return len(records)
+
+    def prepare(self):
+        """First start: import the JSON profile records."""
+        if self.source is None or not self.is_empty():
+            return 0
+        return self.import_records(dict(self.source.records()))
+
+    def update(self, username, fields):
+        with self._transaction() as db:
+            if not db.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone():
+                raise ValueError(f"Username '{username}' not found")
+            self._set_fields(db, username, fields)
+
+    def append(self, username, field, value):
+        with self._transaction() as db:
+            if not db.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone():
+                raise ValueError(f"Username '{username}' not found")
+            if field in POST_LISTS:
+                db.execute("INSERT INTO user_posts VALUES (?, ?, ?)", (username, field, value))
+            else:
+                row = db.execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+                data = json.loads(row["data"])
+                data.setdefault(field, []).append(value)
+                db.execute("UPDATE users SET data = ? WHERE username = ?", (json.dumps(data), username))
+
+    def follow(self, follower, followee, on=True):
+        """Add (or with on=False remove) one follow, checking both users exist."""
+        with self._transaction() as db:
+            found = db.execute(
+                "SELECT COUNT(*) FROM users WHERE username IN (?, ?)", (follower, followee)
+            ).fetchone()[0]
+            if found < len({follower, followee}):
+                raise ValueError("One of the users does not exist")
+            if on:
+                db.execute("INSERT OR IGNORE INTO follows VALUES (?, ?)", (follower, followee))
+            else:
+                db.execute("DELETE FROM follows WHERE follower = ? AND followee = ?", (follower, followee))
+
+
+class SqliteRoomStore(_SqliteStore):
+    """
+    Rooms and chats of the "sqlite" backend: one row per record and one
+    per message, in the same database as the posts. Wrapped content keys
+    stay files under logs/<kind>/<name>/keys, as on the files backend.
+    Same interface as FileRoomStore.
+    """
+
+    def __init__(self, path, logs_dir, source=None):
+        super().__init__(path, ROOM_SCHEMA)
+        self.logs_dir = Path(logs_dir)
+        # FileRoomStore imported on first start
+        self.source = source
+
+    # ------------ RECORDS ------------
+    def names(self, kind):
+        return [row["name"] for row in self._query(
+            "SELECT name FROM conversations WHERE kind = ? ORDER BY name", (kind,)
+        )]
+
+    def exists(self, kind, name):
+        return bool(self._query("SELECT 1 FROM conversations WHERE kind = ? AND name = ?", (kind, name)))
+
+    def get(self, kind, name):
+        rows = self._query("SELECT data FROM conversations WHERE kind = ? AND name = ?", (kind, name))
+        return json.loads(rows[0]["data"]) if rows else None
+
+    def put(self, kind, name, record):
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO conversations VALUES (?, ?, ?)", (kind, name, json.dumps(record)))
+
+    def delete(self, kind, name):
+        """Drop a record and its messages in one transaction, then its key files."""
+        with self._transaction() as db:
+            db.execute("DELETE FROM conversations WHERE kind = ? AND name = ?", (kind, name))
+            db.execute("DELETE FROM messages WHERE kind = ? AND name = ?", (kind, name))
+        shutil.rmtree(self.logs_dir / kind / name, ignore_errors=True)
+
+    def is_empty(self):
+        return not self._query("SELECT 1 FROM conversations LIMIT 1")
+
+    # ------------ MESSAGES ------------
+    def log(self, kind, name):
+        return SqliteMessageLog(self, kind, name, self.logs_dir / kind / name)
+
+    def prepare(self):
+        """First start: import the room and chat files with their message logs."""
+        if self.source is None or not self.is_empty():
+            return 0
+        records, messages = [], []
+        for kind in KINDS:
+            for name in self.source.names(kind):
+                record = self.source.get(kind, name)
+                if record is None:
+                    continue
+                # Messages still embedded in an old file come first, as when moved to a log
+                embedded = record.pop("messages", [])
+                logged = [r for _, r in self.source.log(kind, name).iter_from(0)]
+                history = embedded + logged[len(embedded):]
+                records.append((kind, name, json.dumps(record)))
+                messages.extend((kind, name, seq, json.dumps(r)) for seq, r in enumerate(history))
+
+        with self._transaction() as db:
+            # Another session may have imported while we read the files
+            if db.execute("SELECT 1 FROM conversations LIMIT 1").fetchone():
+                return 0
+            db.executemany("INSERT INTO conversations VALUES (?, ?, ?)", records)
+            db.executemany("INSERT INTO messages VALUES (?, ?, ?, ?)", messages)
+        return len(records)
+
+
+class SqliteMessageLog:
+    """
+    The messages of one room or chat, as rows of SqliteRoomStore. Same
+    interface as MessageLog, segments included (SEGMENT_RECORDS sequence
+    numbers each), so history backfills run on either.
+    """
+
+    BATCH = 500     # rows fetched per query while iterating
+
+    def __init__(self, store, kind, name, directory):
+        self.store = store
+        self.key = (kind, name)
+        self.dir = Path(directory)  # holds keys/, the wrapped content keys
+
+    def _length(self, db):
+        return db.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE kind = ? AND name = ?", self.key
+        ).fetchone()[0]
+
+    # ------------ WRITING ------------
+    def append(self, record):
+        """Append one record and return its sequence number."""
+        with self.store._transaction() as db:
+            seq = self._length(db)
+            db.execute("INSERT INTO messages VALUES (?, ?, ?, ?)", self.key + (seq, json.dumps(record)))
+        return seq
+
+    def append_missing(self, records):
+        """Make records the start of the log, appending only those past its current length."""
+        with self.store._transaction() as db:
+            start = self._length(db)
+            db.executemany(
+                "INSERT INTO messages VALUES (?, ?, ?, ?)",
+                [self.key + (start + i, json.dumps(r)) for i, r in enumerate(records[start:])],
+            )
+
+    def rewrite(self, transform, segments=None):
+        """
+        Rewrite records in place (positions never change).
+        transform(seq, record) returns the new record, or None to keep it.
+        """
+        with self.store._transaction() as db:
+            for segment in segments if segments is not None else self.segments():
+                for seq, record in self._range(db, segment):
+                    new = transform(seq, record)
+                    if new is not None:
+                        db.execute(
+                            "UPDATE messages SET data = ? WHERE kind = ? AND name = ? AND seq = ?",
+                            (json.dumps(new),) + self.key + (seq,),
+                        )
+
+    def delete(self):
+        with self.store._transaction() as db:
+            db.execute("DELETE FROM messages WHERE kind = ? AND name = ?", self.key)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    # ------------ READING ------------
+    def _range(self, db, segment):
+        rows = db.execute(
+            "SELECT seq, data FROM messages WHERE kind = ? AND name = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            self.key + (segment * SEGMENT_RECORDS, (segment + 1) * SEGMENT_RECORDS),
+        ).fetchall()
+        return [(row["seq"], json.loads(row["data"])) for row in rows]
+
+    def segments(self):
+        return list(range((len(self) + SEGMENT_RECORDS - 1) // SEGMENT_RECORDS))
+
+    def read_segment(self, segment):
+        """(seq, record) pairs of one segment."""
+        with self.store._mutex:
+            return self._range(self.store._db, segment)
+
+    def __len__(self):
+        with self.store._mutex:
+            return self._length(self.store._db)
+
+    def iter_from(self, start=0):
+        """Yield (seq, record) from sequence number start onwards."""
+        while True:
+            rows = self.store._query(
+                "SELECT seq, data FROM messages WHERE kind = ? AND name = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                self.key + (start, self.BATCH),
+            )
+            for row in rows:
+                yield row["seq"], json.loads(row["data"])
+            if len(rows) < self.BATCH:
+                return
+            start = rows[-1]["seq"] + 1
+
+    def iter_reverse(self):
+        """Yield (seq, record) newest first, a batch of rows at a time."""
+        end = None
+        while True:
+            rows = self.store._query(
+                "SELECT seq, data FROM messages WHERE kind = ? AND name = ?"
+                f"{' AND seq < ?' if end is not None else ''} ORDER BY seq DESC LIMIT ?",
+                self.key + ((end,) if end is not None else ()) + (self.BATCH,),
+            )
+            for row in rows:
+                yield row["seq"], json.loads(row["data"])
+            if len(rows) < self.BATCH:
+                return
+            end = rows[-1]["seq"]
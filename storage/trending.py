@@ -0,0 +1,144 @@
+import hashlib
+import json
+import math
+import re
+import time
+from pathlib import Path
+
+from storage.locks import file_lock
+from storage.fileio import JsonlTail, write_atomic, write_json
+
+# Count-min sketch size: error ~ e/WIDTH of the total weight, with
+# probability 1 - e^-DEPTH
+WIDTH = 2048
+DEPTH = 4
+
+# Candidates kept for the trending list
+TOP_K = 100
+
+# A mention/hashtag loses half its weight every HALF_LIFE seconds
+HALF_LIFE = 6 * 3600
+DECAY = math.log(2) / HALF_LIFE
+
+# Weights are stored relative to a landmark time ("forward decay"), so old
+# counts never need rewriting; the landmark moves before they overflow
+MAX_EXPONENT = 60
+
+# Fold the event log into the snapshot once it has this many lines
+SNAPSHOT_EVENTS = 2000
+
+TAG = re.compile(r"(?<![\w#@])([#@])(\w+)")
+
+
+def extract_tags(text):
+    """Distinct "#hashtag" and "@mention" tokens of a post, lowercased."""
+    return sorted({sign + word.lower() for sign, word in TAG.findall(text or "")})
+
+
+def _buckets(tag):
+    # Stable across processes (unlike hash())
+    digest = hashlib.blake2b(tag.encode(), digest_size=4 * DEPTH).digest()
+    return [int.from_bytes(digest[4 * i:4 * i + 4], "big") % WIDTH for i in range(DEPTH)]
+
+
+class TrendingTags:
+    """
+    Exponentially decayed hashtag/mention counts in bounded memory.
+
+    A count-min sketch estimates each tag's decayed count and a top-k
+    table keeps the heaviest tags. New posts append one line to
+    events.jsonl; every session tails it like the post catalog, and it is
+    periodically folded into snapshot.json, so the state on disk grows
+    with the sketch size, not the number of posts.
+    """
+
+    def __init__(self, directory):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.events_path = self.dir / "events.jsonl"
+        self.snapshot_path = self.dir / "snapshot.json"
+        self._log = JsonlTail(self.events_path)
+        self._lines = 0
+        self._load_snapshot()
+
+    # ------------ STATE ------------
+    def _load_snapshot(self):
+        snapshot = {}
+        if self.snapshot_path.exists():
+            snapshot = json.loads(self.snapshot_path.read_text())
+        self.landmark = snapshot.get("landmark", time.time())
+        self.sketch = snapshot.get("sketch") or [[0.0] * WIDTH for _ in range(DEPTH)]
+        self.top = snapshot.get("top", {})     # tag -> weight relative to landmark
+
+    def _move_landmark(self, when):
+        scale = math.exp(-DECAY * (when - self.landmark))
+        self.sketch = [[c * scale for c in row] for row in self.sketch]
+        self.top = {tag: w * scale for tag, w in self.top.items()}
+        self.landmark = when
+
+    def _add(self, tag, when):
+        if DECAY * (when - self.landmark) > MAX_EXPONENT:
+            self._move_landmark(when)
+        weight = math.exp(DECAY * (when - self.landmark))
+        estimate = None
+        for row, i in zip(self.sketch, _buckets(tag)):
+            row[i] += weight
+            estimate = row[i] if estimate is None else min(estimate, row[i])
+
+        if tag in self.top or len(self.top) < TOP_K:
+            self.top[tag] = estimate
+            return
+        weakest = min(self.top, key=self.top.get)
+        if estimate > self.top[weakest]:
+            del self.top[weakest]
+            self.top[tag] = estimate
+
+    # ------------ EVENT LOG ------------
+    def _refresh(self):
+        restarted, events = self._log.poll()
+        if restarted:
+            # New log (first look, or folded into a new snapshot) → start from the snapshot
+            self._load_snapshot()
+            self._lines = 0
+        for event in events:
+            for tag in event["tags"]:
+                self._add(tag, event["t"])
+            self._lines += 1
+
+    def _fold(self):
+        """Write the current state as the snapshot and start an empty event log."""
+        snapshot = {"landmark": self.landmark, "sketch": self.sketch, "top": self.top}
+        write_json(self.snapshot_path, snapshot, separators=(",", ":"))
+        write_atomic(self.events_path, "")
+        # The next refresh reloads the snapshot we just wrote
+        self._log.forget()
+        self._lines = 0
+
+    def record(self, tags, when=None):
+        """Count the tags of one new post."""
+        if not tags:
+            return
+        event = {"t": time.time() if when is None else when, "tags": list(tags)}
+        with file_lock(self.dir / ".lock"):
+            with open(self.events_path, "a") as f:
+                f.write(json.dumps(event) + "\n")
+            # Counts are not idempotent: apply our line by reading it back
+            self._refresh()
+            if self._lines >= SNAPSHOT_EVENTS:
+                self._fold()
+
+    # ------------ QUERIES ------------
+    def top_tags(self, k=10, kind=None, now=None):
+        """
+        [(tag, decayed count)] heaviest first; kind "#" or "@" keeps only
+        hashtags or mentions.
+        """
+        self._refresh()
+        now = time.time() if now is None else now
+        scale = math.exp(-DECAY * (now - self.landmark))
+        ranked = sorted(
+            ((tag, weight * scale) for tag, weight in self.top.items()
+             if kind is None or tag.startswith(kind)),
+            key=lambda item: item[1], reverse=True,
+        )
+        return ranked[:k]